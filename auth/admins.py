@@ -0,0 +1,12 @@
+"""
+Администраторы бота: пользователи, которым доступны служебные команды
+(/refresh, /profile). Telegram id перечисляются через запятую в BOT_ADMINS.
+"""
+
+import os
+
+BOT_ADMINS = {int(user_id) for user_id in os.getenv("BOT_ADMINS", "").split(",") if user_id.strip()}
+
+
+def is_admin(user_id: int) -> bool:
+    return user_id in BOT_ADMINS
@@ -0,0 +1,180 @@
+"""
+Сравнение задержки ответа бота в трех режимах на локальной имитации Bot API:
+
+- sync_polling - bot/bot.py: TeleBot.polling(interval=2);
+- async_polling - bot/async_bot.py без WEBHOOK_URL: AsyncTeleBot.infinity_polling();
+- webhook - bot/async_bot.py с WEBHOOK_URL: aiohttp-сервер из create_app().
+
+Боты настраиваются так же, как при обычном запуске (модули bot.py и async_bot.py
+импортируются с TELEGRAM_API_URL, указывающим на имитацию). Вместо обработчиков
+документов регистрируется обработчик "ping N", который отвечает "pong N" через
+очередь отправки; задержка - время от появления сообщения пользователя на сервере
+до получения сервером ответа бота. Сообщения отправляются со случайной паузой,
+чтобы попадать в разные моменты цикла опроса.
+
+Запуск:
+    python -m benchmarks.bot_latency --messages 10
+"""
+
+import argparse
+import asyncio
+import importlib
+import os
+import random
+import socket
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from aiohttp import web
+
+from benchmarks.fake_telegram_api import FakeTelegramAPI
+
+BOT_DIR = Path(__file__).parent.parent / "bot"
+
+SYNC_TOKEN = "1001:sync-polling"
+ASYNC_TOKEN = "1002:async"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class LoopThread:
+    """Цикл событий asyncio в отдельном потоке."""
+
+    def __init__(self, name: str):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name=name, daemon=True)
+        self._thread.start()
+
+    def run(self, coro, timeout: float = 60):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def stop(self) -> None:
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+
+
+def register_ping_handler(bot, sender, is_async: bool) -> None:
+    """Обработчик 'ping N' -> 'pong N' для измерений."""
+    if is_async:
+        @bot.message_handler(func=lambda message: (message.text or "").startswith("ping"))
+        async def handler_ping(message):
+            sender.send_text(message.chat.id, message.text.replace("ping", "pong", 1))
+    else:
+        @bot.message_handler(func=lambda message: (message.text or "").startswith("ping"))
+        def handler_ping(message):
+            sender.send_text(message.chat.id, message.text.replace("ping", "pong", 1))
+
+
+def measure(api: FakeTelegramAPI, api_thread: LoopThread, token: str, messages: int,
+            max_pause: float) -> List[float]:
+    """Отправляет боту messages сообщений и возвращает задержки ответов в секундах."""
+    latencies = []
+    for num in range(messages):
+        time.sleep(random.uniform(0, max_pause))
+        # Отдельный чат на каждое сообщение: ограничение частоты отправки в чат не влияет на замер
+        chat_id = 10_000 + num
+        pushed_at = time.perf_counter()
+        api_thread.run(api.push_message(token, chat_id, f"ping {num}"))
+        while True:
+            sent = api.sent.get(timeout=30)
+            if sent.token == token and sent.chat_id == chat_id:
+                break
+        latencies.append(sent.received_at - pushed_at)
+    return latencies
+
+
+def run_sync_polling(api, api_thread, messages, max_pause) -> List[float]:
+    os.environ["TOKEN_BOT"] = SYNC_TOKEN
+    bot_module = importlib.import_module("bot")
+    register_ping_handler(bot_module.bot, bot_module.sender, is_async=False)
+    # Как в bot.main()
+    polling = threading.Thread(target=bot_module.bot.polling,
+                               kwargs={"none_stop": True, "interval": 2}, daemon=True)
+    polling.start()
+    try:
+        return measure(api, api_thread, SYNC_TOKEN, messages, max_pause)
+    finally:
+        bot_module.bot.stop_polling()
+
+
+def run_async_polling(async_bot, api, api_thread, messages, max_pause) -> List[float]:
+    bot_thread = LoopThread("async-polling")
+    task = asyncio.run_coroutine_threadsafe(async_bot.bot.infinity_polling(), bot_thread.loop)
+    try:
+        return measure(api, api_thread, ASYNC_TOKEN, messages, max_pause)
+    finally:
+        task.cancel()
+        bot_thread.run(async_bot.bot.close_session())
+        bot_thread.stop()
+
+
+def run_webhook(async_bot, api, api_thread, messages, max_pause) -> List[float]:
+    bot_thread = LoopThread("webhook")
+    runner = web.AppRunner(async_bot.create_app())
+    bot_thread.run(runner.setup())
+    bot_thread.run(web.TCPSite(runner, async_bot.WEBHOOK_HOST, async_bot.WEBHOOK_PORT).start())
+    try:
+        return measure(api, api_thread, ASYNC_TOKEN, messages, max_pause)
+    finally:
+        bot_thread.run(runner.cleanup())
+        bot_thread.stop()
+
+
+def format_stats(name: str, latencies: List[float]) -> str:
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, round(0.95 * (len(ordered) - 1)))]
+    return (f"{name:<14} среднее {statistics.mean(ordered) * 1000:8.1f} мс  "
+            f"медиана {statistics.median(ordered) * 1000:8.1f} мс  "
+            f"p95 {p95 * 1000:8.1f} мс  макс {ordered[-1] * 1000:8.1f} мс")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Задержка ответа бота: polling и webhook")
+    parser.add_argument("--messages", type=int, default=10, help="Сообщений на режим")
+    parser.add_argument("--max-pause", type=float, default=2.5, help="Максимальная пауза между сообщениями, сек")
+    args = parser.parse_args()
+
+    # Модули бота импортируются как при запуске python bot/bot.py
+    sys.path.insert(0, str(BOT_DIR))
+
+    api = FakeTelegramAPI()
+    api_thread = LoopThread("fake-telegram-api")
+    api_port, webhook_port = free_port(), free_port()
+    api_runner = web.AppRunner(api.create_app())
+    api_thread.run(api_runner.setup())
+    api_thread.run(web.TCPSite(api_runner, "127.0.0.1", api_port).start())
+
+    os.environ.update({
+        "TELEGRAM_API_URL": f"http://127.0.0.1:{api_port}",
+        "WEBHOOK_HOST": "127.0.0.1",
+        "WEBHOOK_PORT": str(webhook_port),
+        "WEBHOOK_URL": f"http://127.0.0.1:{webhook_port}",
+        "WEBHOOK_SECRET": "benchmark-secret",
+    })
+
+    results: Dict[str, List[float]] = {}
+    results["sync_polling"] = run_sync_polling(api, api_thread, args.messages, args.max_pause)
+
+    os.environ["TOKEN_BOT"] = ASYNC_TOKEN
+    async_bot = importlib.import_module("async_bot")
+    register_ping_handler(async_bot.bot, async_bot.sender, is_async=True)
+    modes: Dict[str, Callable] = {"async_polling": run_async_polling, "webhook": run_webhook}
+    for name, run in modes.items():
+        results[name] = run(async_bot, api, api_thread, args.messages, args.max_pause)
+
+    api_thread.run(api_runner.cleanup())
+    api_thread.stop()
+    for name, latencies in results.items():
+        print(format_stats(name, latencies))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Локальный сервер, имитирующий Telegram Bot API, для измерения задержки ответа бота.
+
+Поддерживает методы, которые нужны боту для приема и отправки сообщений:
+getUpdates (long polling), setWebhook/deleteWebhook (при активном webhook
+обновления отправляются POST-запросом на его адрес), sendMessage, getMe.
+Остальные методы отвечают успехом без результата. Состояние хранится отдельно
+для каждого токена, поэтому разные боты не забирают обновления друг друга.
+
+Запуск отдельно (бот подключается через TELEGRAM_API_URL=http://127.0.0.1:8081):
+    python -m benchmarks.fake_telegram_api --port 8081
+
+Сообщение пользователя имитируется запросом
+    POST /fake/bot<токен>/push {"chat_id": 1, "text": "/start"}
+"""
+
+import argparse
+import asyncio
+import itertools
+import logging
+import queue
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl
+
+import aiohttp
+from aiohttp import web
+
+from logs.logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
+setup_logging()
+
+FAKE_BOT_USER = {"id": 1, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot"}
+
+
+@dataclass
+class SentMessage:
+    """Сообщение, отправленное ботом через sendMessage."""
+    token: str
+    chat_id: int
+    text: str
+    received_at: float  # time.perf_counter() в момент получения запроса
+
+
+@dataclass
+class FakeBotState:
+    """Состояние одного бота: очередь обновлений и webhook."""
+    updates: List[dict] = field(default_factory=list)
+    webhook_url: Optional[str] = None
+    webhook_secret: Optional[str] = None
+    new_update: Optional[asyncio.Condition] = None
+
+
+class FakeTelegramAPI:
+    """Имитация Bot API. Методы с префиксом _api_ соответствуют методам Bot API."""
+
+    def __init__(self):
+        self._bots: Dict[str, FakeBotState] = defaultdict(FakeBotState)
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._session: Optional[aiohttp.ClientSession] = None
+        # Отправленные ботами сообщения; очередь потокобезопасна, ее читает код измерений
+        self.sent: "queue.Queue[SentMessage]" = queue.Queue()
+
+    def _state(self, token: str) -> FakeBotState:
+        state = self._bots[token]
+        if state.new_update is None:
+            state.new_update = asyncio.Condition()
+        return state
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_route("*", "/bot{token}/{method}", self._handle)
+        app.router.add_post("/fake/bot{token}/push", self._handle_push)
+        app.on_cleanup.append(self._on_cleanup)
+        return app
+
+    async def _on_cleanup(self, app: web.Application) -> None:
+        if self._session:
+            await self._session.close()
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        token, method = request.match_info["token"], request.match_info["method"]
+        params = dict(request.query)
+        if request.can_read_body:
+            params.update(await self._read_body(request))
+
+        handler = getattr(self, f"_api_{method}", None)
+        if handler is None:
+            return web.json_response({"ok": True, "result": True})
+        try:
+            result = await handler(self._state(token), token, params)
+        except ConflictError as e:
+            return web.json_response({"ok": False, "error_code": 409, "description": str(e)}, status=409)
+        return web.json_response({"ok": True, "result": result})
+
+    @staticmethod
+    async def _read_body(request: web.Request) -> dict:
+        """
+        Параметры из тела запроса. AsyncTeleBot передает форму и в GET-запросах,
+        а request.post() читает тело только у POST, поэтому форма разбирается вручную.
+        """
+        if request.content_type == "application/json":
+            return await request.json()
+        if request.content_type == "multipart/form-data":
+            params = {}
+            reader = await request.multipart()
+            async for part in reader:
+                # Файлы имитации не нужны
+                if part.filename is None:
+                    params[part.name] = await part.text()
+            return params
+        return dict(parse_qsl(await request.text()))
+
+    async def _handle_push(self, request: web.Request) -> web.Response:
+        data = await request.json()
+        await self.push_message(request.match_info["token"], int(data["chat_id"]), data["text"])
+        return web.json_response({"ok": True})
+
+    async def _api_getMe(self, state: FakeBotState, token: str, params: dict) -> dict:
+        return FAKE_BOT_USER
+
+    async def _api_getUpdates(self, state: FakeBotState, token: str, params: dict) -> List[dict]:
+        if state.webhook_url:
+            raise ConflictError("Conflict: can't use getUpdates method while webhook is active")
+        offset = int(params.get("offset") or 0)
+        timeout = float(params.get("timeout") or 0)
+        # Обновления с id меньше offset подтверждены ботом
+        state.updates = [update for update in state.updates if update["update_id"] >= offset]
+        if not state.updates and timeout > 0:
+            async with state.new_update:
+                try:
+                    await asyncio.wait_for(state.new_update.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        return list(state.updates)
+
+    async def _api_setWebhook(self, state: FakeBotState, token: str, params: dict) -> bool:
+        state.webhook_url = params.get("url") or None
+        state.webhook_secret = params.get("secret_token") or None
+        return True
+
+    async def _api_deleteWebhook(self, state: FakeBotState, token: str, params: dict) -> bool:
+        state.webhook_url = state.webhook_secret = None
+        return True
+
+    async def _api_sendMessage(self, state: FakeBotState, token: str, params: dict) -> dict:
+        chat_id, text = int(params["chat_id"]), params.get("text", "")
+        self.sent.put(SentMessage(token, chat_id, text, time.perf_counter()))
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": FAKE_BOT_USER,
+            "text": text,
+        }
+
+    async def push_message(self, token: str, chat_id: int, text: str) -> None:
+        """Имитирует сообщение пользователя боту: через webhook или в очередь getUpdates."""
+        update_id = next(self._update_ids)
+        update = {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": {"id": chat_id, "is_bot": False, "first_name": "User"},
+                "text": text,
+            },
+        }
+        state = self._state(token)
+        if state.webhook_url:
+            if self._session is None:
+                self._session = aiohttp.ClientSession()
+            headers = {"X-Telegram-Bot-Api-Secret-Token": state.webhook_secret} if state.webhook_secret else {}
+            async with self._session.post(state.webhook_url, json=update, headers=headers) as response:
+                if response.status != 200:
+                    logger.warning(f"Webhook ответил {response.status}")
+            return
+        state.updates.append(update)
+        async with state.new_update:
+            state.new_update.notify_all()
+
+
+class ConflictError(RuntimeError):
+    """Ответ 409 Bot API."""
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Локальная имитация Telegram Bot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    args = parser.parse_args()
+    web.run_app(FakeTelegramAPI().create_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Асинхронный режим Telegram-бота на AsyncTeleBot.
+
+Если задан WEBHOOK_URL, бот поднимает локальный HTTP-сервер и получает обновления
+через webhook; иначе использует long polling без фиксированного интервала опроса.
+TELEGRAM_API_URL позволяет направить запросы к локальному тестовому серверу Bot API.
+"""
+
+import asyncio
+import hmac
+import logging
+import os
+
+import telebot
+from aiohttp import web
+from dotenv import load_dotenv
+from telebot import apihelper, asyncio_helper, types
+from telebot.async_telebot import AsyncTeleBot
+
+from database.create_database import create_tables
+from handlers.async_handler_document import handler_excel_document_async
+from handlers.handler_profile import handler_profile_async
+from handlers.handler_search import handler_search_async
+from logs.logging_config import setup_logging
+from sender import MessageSender
+
+
+logger = logging.getLogger(__name__)
+
+# Загрузка переменных окружения
+load_dotenv()
+TOKEN = os.getenv("TOKEN_BOT")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # Публичный адрес, например https://example.com
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", 8443))
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")
+
+if not TOKEN:
+    logger.critical("Токен бота не найден! Проверьте .env файл")
+    raise ValueError("Токен бота не найден в переменных окружения")
+
+if WEBHOOK_URL and not WEBHOOK_SECRET:
+    # Без секрета любой, кто знает адрес webhook, может прислать поддельное обновление
+    logger.critical("Для режима webhook задайте WEBHOOK_SECRET")
+    raise ValueError("WEBHOOK_SECRET обязателен, если задан WEBHOOK_URL")
+
+if TELEGRAM_API_URL:
+    asyncio_helper.API_URL = apihelper.API_URL = TELEGRAM_API_URL.rstrip("/") + "/bot{0}/{1}"
+    asyncio_helper.FILE_URL = apihelper.FILE_URL = TELEGRAM_API_URL.rstrip("/") + "/file/bot{0}/{1}"
+
+bot = AsyncTeleBot(TOKEN)
+# Исходящие сообщения отправляются потоками очереди с учетом лимитов Telegram,
+# поэтому обработчики не ждут отправки и не упираются в 429
+sender = MessageSender(telebot.TeleBot(TOKEN, threaded=False))
+
+WEBHOOK_PATH = f"/webhook/{TOKEN.split(':')[0]}"
+
+# Ссылки на фоновые задачи, чтобы их не удалил сборщик мусора до завершения
+_background_tasks = set()
+
+
+async def handle_update(request: web.Request) -> web.Response:
+    """Принимает обновление от Telegram и сразу отвечает, обработка идет в фоне."""
+    secret = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+    if not hmac.compare_digest(secret.encode(), WEBHOOK_SECRET.encode()):
+        logger.warning("Отклонен запрос к webhook с неверным секретом")
+        return web.Response(status=403)
+
+    update = types.Update.de_json(await request.text())
+    task = asyncio.create_task(bot.process_new_updates([update]))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return web.Response()
+
+
+async def on_startup(app: web.Application) -> None:
+    await bot.set_webhook(url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH, secret_token=WEBHOOK_SECRET)
+    logger.info(f"Webhook установлен, сервер слушает {WEBHOOK_HOST}:{WEBHOOK_PORT}")
+
+
+async def on_cleanup(app: web.Application) -> None:
+    await bot.remove_webhook()
+    await bot.close_session()
+
+
+def create_app() -> web.Application:
+    """Создает приложение aiohttp с обработчиком webhook."""
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, handle_update)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+def main() -> None:
+    """Основная функция запуска асинхронного бота."""
+    try:
+        logger.info("Запуск асинхронного бота")
+        # Команды регистрируются до обработчика произвольного текста
+        handler_search_async(bot, sender)
+        handler_profile_async(bot, sender)
+        handler_excel_document_async(bot, sender)
+        if WEBHOOK_URL:
+            web.run_app(create_app(), host=WEBHOOK_HOST, port=WEBHOOK_PORT)
+        else:
+            asyncio.run(bot.infinity_polling())
+    except Exception as e:
+        logger.critical(f"Критическая ошибка: {str(e)}", exc_info=True)
+    finally:
+        logger.info("Работа бота завершена")
+
+
+if __name__ == '__main__':
+    setup_logging()
+    create_tables()
+    main()
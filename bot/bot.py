@@ -7,10 +7,14 @@ import os
 import logging
 import telebot
 from dotenv import load_dotenv
+from telebot import apihelper
 
 from database.create_database import create_tables
 from handlers.handler_document import handler_excel_document
+from handlers.handler_profile import handler_profile
+from handlers.handler_search import handler_search
 from logs.logging_config import setup_logging
+from sender import MessageSender
 
 
 logger = logging.getLogger(__name__)
@@ -18,19 +22,29 @@ logger = logging.getLogger(__name__)
 # Загрузка переменных окружения
 load_dotenv()
 TOKEN = os.getenv("TOKEN_BOT")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")
 
 if not TOKEN:
     logger.critical("Токен бота не найден! Проверьте .env файл")
     raise ValueError("Токен бота не найден в переменных окружения")
 
+if TELEGRAM_API_URL:
+    apihelper.API_URL = TELEGRAM_API_URL.rstrip("/") + "/bot{0}/{1}"
+    apihelper.FILE_URL = TELEGRAM_API_URL.rstrip("/") + "/file/bot{0}/{1}"
+
 bot = telebot.TeleBot(TOKEN)
+# Все исходящие сообщения идут через очередь с учетом лимитов Telegram
+sender = MessageSender(bot)
 
 
 def main() -> None:
     """Основная функция запуска бота."""
     try:
         logger.info("Запуск бота")
-        handler_excel_document(bot)
+        # Команды регистрируются до обработчика произвольного текста
+        handler_search(bot, sender)
+        handler_profile(bot, sender)
+        handler_excel_document(bot, sender)
         logger.info("Бот успешно запущен")
         bot.polling(none_stop=True, interval=2)
     except Exception as e:
@@ -0,0 +1,134 @@
+"""
+Асинхронные обработчики для AsyncTeleBot.
+Блокирующая обработка (pandas, SQLite, Selenium) выполняется в потоках,
+поэтому цикл событий продолжает принимать обновления от других чатов.
+"""
+
+import asyncio
+import logging
+
+from telebot import types
+from telebot.async_telebot import AsyncTeleBot
+
+from auth.admins import is_admin
+from handlers.handler_document import (
+    CRAWL_MODE,
+    CRAWL_START_TEXT,
+    REPORT_FORMAT,
+    find_cached_upload,
+    format_crawl_summary,
+    format_refresh_summary,
+    format_saved_text,
+    format_upload_error,
+    format_upload_prices,
+    process_upload,
+)
+from logs.logging_config import setup_logging
+from parsers.parser_onlinetrade import parser_online_trade
+from parsers.price_refresh import refresh_prices
+from profiling.profiler import format_profile_summary, profile_job
+from reports.report_writer import build_report
+from task_queue.jobs import parser_online_trade_distributed_async
+
+logger = logging.getLogger(__name__)
+setup_logging()
+
+
+async def run_crawl_async() -> dict:
+    """Запускает парсинг onlinetrade.ru в режиме CRAWL_MODE, не блокируя цикл событий."""
+    if CRAWL_MODE == "queue":
+        return await parser_online_trade_distributed_async()
+    return await asyncio.to_thread(parser_online_trade)
+
+
+def handler_excel_document_async(bot: AsyncTeleBot, sender):
+    @bot.message_handler(commands=['start'])
+    async def handler_start(message: types.Message) -> None:
+        """Обработчик команды /start."""
+        try:
+            logger.info(f"Новый пользователь: {message.from_user.id}")
+            sender.send_text(
+                message.chat.id,
+                "Загрузите Excel-файл в формате .xlsx\n"
+                "Убедитесь, что файл содержит колонки:\n"
+                "- title\n- url\n- xpath"
+            )
+        except Exception as exp:
+            logger.error(f"Ошибка в обработчике /start: {str(exp)}", exc_info=True)
+            sender.send_text(
+                message.chat.id,
+                "Произошла внутренняя ошибка. Попробуйте позже."
+            )
+
+    @bot.message_handler(content_types=['document'])
+    async def get_dokument(message: types.Message):
+        """Обработка загруженных Excel-файлов."""
+        if not message.document.file_name.endswith(('.xlsx',)):
+            sender.send_text(
+                message.chat.id,
+                "Неправильный формат файла. Требуется .xlsx"
+            )
+            return
+
+        try:
+            # Профилировщик снимает стеки всех потоков, включая потоки asyncio.to_thread
+            with profile_job("upload") as profile:
+                # Повторная загрузка того же файла не требует скачивания и разбора
+                upload = await asyncio.to_thread(find_cached_upload, message.document)
+                if upload is None:
+                    file_info = await bot.get_file(message.document.file_id)
+                    upload = await asyncio.to_thread(
+                        process_upload, bot.token, file_info.file_path, message.document.file_unique_id
+                    )
+
+                sender.reply_to(message, format_saved_text(upload["text"], upload["rows_count"]))
+                if upload["first_item_id"] is not None:
+                    sender.send_text(message.chat.id, "Обновляю цены по ссылкам из файла...")
+                    refresh_stats = await asyncio.to_thread(
+                        refresh_prices, upload["first_item_id"], upload["last_item_id"]
+                    )
+                    sender.send_text(message.chat.id, format_refresh_summary(refresh_stats))
+                    prices_text = await asyncio.to_thread(
+                        format_upload_prices, upload["first_item_id"], upload["last_item_id"]
+                    )
+                    sender.send_text(message.chat.id, prices_text)
+                sender.send_text(message.chat.id, CRAWL_START_TEXT)
+                crawl_stats = await run_crawl_async()
+                sender.send_text(message.chat.id, format_crawl_summary(crawl_stats))
+
+                report_path = await asyncio.to_thread(build_report, upload, crawl_stats, REPORT_FORMAT)
+                sender.send_document(message.chat.id, report_path, remove_after=True,
+                                     caption="Отчет по загруженным данным")
+            if profile:
+                sender.send_text(message.chat.id, format_profile_summary(profile))
+        except Exception as e:
+            logger.error(f"Ошибка: {str(e)}")
+            sender.reply_to(message, format_upload_error(e))
+
+    @bot.message_handler(commands=['refresh'])
+    async def handler_refresh(message: types.Message) -> None:
+        """
+        Обработчик команды /refresh: обновляет цены всех сохраненных строк по xpath.
+        Загружает ссылки из таблиц всех пользователей, поэтому доступен только администратору.
+        """
+        if not is_admin(message.from_user.id):
+            sender.send_text(message.chat.id, "Команда доступна только администратору")
+            return
+        try:
+            sender.send_text(message.chat.id, "Обновляю цены по всем сохраненным ссылкам...")
+            with profile_job("refresh") as profile:
+                stats = await asyncio.to_thread(refresh_prices)
+            sender.send_text(message.chat.id, format_refresh_summary(stats))
+            if profile:
+                sender.send_text(message.chat.id, format_profile_summary(profile))
+        except Exception as exp:
+            logger.error(f"Ошибка в обработчике /refresh: {str(exp)}", exc_info=True)
+            sender.send_text(message.chat.id, "Не удалось обновить цены. Попробуйте позже.")
+
+    @bot.message_handler(content_types=["text"])
+    async def handler_some_text(message: types.Message):
+        """Обработка текстовых сообщений."""
+        sender.send_text(
+            message.chat.id,
+            "Пожалуйста, загрузите файл в формате Excel (.xlsx)"
+        )
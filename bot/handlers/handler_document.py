@@ -1,71 +1,178 @@
 import logging
 import os
-from pathlib import Path
+from typing import Optional
 
 import telebot
 from telebot import types
 
+from auth.admins import is_admin
 from database.create_database import create_tables
 from database.insert_data import insert_data_bd
+from database.uploads import get_upload, save_upload
 from logs.logging_config import setup_logging
 from pandas_dir.panda_file_riter import get_data_file
 from parsers.parser_onlinetrade import parser_online_trade
-from text_handler import get_text
+from parsers.price_refresh import refresh_prices
+from profiling.profiler import format_profile_summary, profile_job, stage
+from reports.report_writer import build_report, iter_item_rows
+from storage.content_store import MAX_UPLOAD_SIZE, FileDownloadError, UploadTooLargeError, store_telegram_file
+from task_queue.jobs import parser_online_trade_distributed
+from text_handler import get_prices_text, get_text
 
 logger = logging.getLogger(__name__)
 setup_logging()
 
+# local - парсинг в процессе бота, queue - через очередь задач и воркеры
+CRAWL_MODE = os.getenv("CRAWL_MODE", "local")
+# Формат отчета, отправляемого документом: xlsx или csv
+REPORT_FORMAT = os.getenv("REPORT_FORMAT", "xlsx")
 
-def handler_excel_document(bot):
+# Список длиннее нескольких сообщений отправляется только в отчете
+MAX_INLINE_TEXT_LENGTH = 5 * 4096
+
+CRAWL_START_TEXT = ("Сейчас проанализирую стоимость телефонов на www.onlinetrade.ru\n"
+                    "Подождите немного")
+
+
+def find_cached_upload(document: types.Document) -> Optional[dict]:
+    """Ищет уже обработанный файл по file_unique_id, не скачивая его."""
+    if document.file_size and document.file_size > MAX_UPLOAD_SIZE:
+        raise UploadTooLargeError(f"Файл больше {MAX_UPLOAD_SIZE // (1024 * 1024)} МБ")
+    return get_upload(file_unique_id=document.file_unique_id)
+
+
+def process_upload(token: str, telegram_file_path: str, file_unique_id: str) -> dict:
+    """
+    Потоково скачивает файл в хранилище и разбирает его.
+    Если файл с таким содержимым уже загружался, возвращает сохраненный результат.
+    """
+    with stage("download"):
+        stored = store_telegram_file(token, telegram_file_path)
+    cached = get_upload(sha256=stored.sha256)
+    if cached:
+        logger.info(f"Файл {stored.sha256} уже обработан, используем сохраненный результат")
+        return cached
+
+    with stage("excel_parse"):
+        data = get_data_file(stored.path)
+        text = get_text(data)
+    first_item_id, last_item_id = insert_data_bd(data)
+    upload = {
+        "sha256": stored.sha256,
+        "file_unique_id": file_unique_id,
+        "file_path": stored.path,
+        "size": stored.size,
+        "rows_count": len(data),
+        "first_item_id": first_item_id,
+        "last_item_id": last_item_id,
+        "text": text,
+    }
+    save_upload(upload)
+    return upload
+
+
+def run_crawl() -> dict:
+    """Запускает парсинг onlinetrade.ru в режиме CRAWL_MODE."""
+    if CRAWL_MODE == "queue":
+        return parser_online_trade_distributed()
+    return parser_online_trade()
+
+
+def format_upload_error(error: Exception) -> str:
+    """
+    Текст ответа пользователю об ошибке обработки файла.
+    Текст исключения показывается только для ошибок, которые мы сформировали сами:
+    в остальных могут быть внутренние пути и URL.
+    """
+    if isinstance(error, UploadTooLargeError):
+        return f"Ошибка: {str(error)}"
+    if isinstance(error, FileDownloadError):
+        return "Не удалось скачать файл из Telegram. Попробуйте позже."
+    if isinstance(error, KeyError):
+        return "В файле нет обязательных колонок: title, url, xpath"
+    return "Не удалось обработать файл. Проверьте, что это корректный .xlsx с колонками title, url, xpath."
+
+
+def format_saved_text(text: str, rows_count: int) -> str:
+    """
+    Текст ответа о сохранении файла. Отправитель делит его на сообщения по границам
+    записей, а слишком длинный список заменяется ссылкой на отчет.
+    """
+    reply = f"Файл сохранен!\n\n{text}"
+    if len(reply) <= MAX_INLINE_TEXT_LENGTH:
+        return reply
+    return f"Файл сохранен! Записей: {rows_count}.\nПолный список будет в отчете."
+
+
+def format_upload_prices(first_item_id: int, last_item_id: int) -> str:
+    """Текст с ценами строк загрузки после обновления; длинный список есть только в отчете."""
+    text = get_prices_text(iter_item_rows(first_item_id, last_item_id), MAX_INLINE_TEXT_LENGTH)
+    if text is None:
+        return "Цены по всем ссылкам из файла будут в отчете."
+    return f"Цены по ссылкам из файла:\n\n{text}"
+
+
+def format_refresh_summary(stats: dict) -> str:
+    """Формирует сообщение с итогами обновления цен по xpath."""
+    return (f"Цены обновлены: {stats['rows_updated']}, не найдены: {stats['rows_failed']}\n"
+            f"Загружено страниц: {stats['pages_ok']}, с ошибками: {stats['pages_failed']}")
+
+
+def format_crawl_summary(data_parser_online_trade: dict) -> str:
+    """Формирует сообщение с итогами парсинга."""
+    if not data_parser_online_trade['total_products']:
+        return "Не удалось получить данные с сайта. Попробуйте позже."
+    average_cost_phone = round(data_parser_online_trade['total_price'] / data_parser_online_trade['total_products'], 2)
+    pages_ok = data_parser_online_trade['pages_ok']
+    pages_total = pages_ok + data_parser_online_trade['pages_failed']
+    return (f"Данные с парсинга страницы:\n"
+            f"Общее кол-во телефонов этой марки: {data_parser_online_trade['total_products']}\n"
+            f"Средняя стоимость телефона {average_cost_phone}\n"
+            f"Обработано страниц: {pages_ok} из {pages_total}"
+            + ("\nВнимание: данные неполные" if pages_ok < pages_total else "")
+            + (f"\nОбход сохранен в архив: {data_parser_online_trade['crawl_id']}"
+               if data_parser_online_trade.get('crawl_id') else ""))
+
+
+def handler_excel_document(bot, sender):
     @bot.message_handler(content_types=['document'])
     def get_dokument(message: types.Message):
         """Обработка загруженных Excel-файлов."""
         # Проверка расширения файла
         if not message.document.file_name.endswith(('.xlsx',)):
-            bot.send_message(
+            sender.send_text(
                 message.chat.id,
                 "Неправильный формат файла. Требуется .xlsx"
             )
             return  # Прерываем выполнение
 
-        # Скачивание файла
-        file_info = bot.get_file(message.document.file_id)
-        downloaded_file = bot.download_file(file_info.file_path)
+        try:
+            with profile_job("upload") as profile:
+                # Повторная загрузка того же файла не требует скачивания и разбора
+                upload = find_cached_upload(message.document)
+                if upload is None:
+                    file_info = bot.get_file(message.document.file_id)
+                    upload = process_upload(bot.token, file_info.file_path, message.document.file_unique_id)
 
-        # Сохранение файла
-        download_dir = os.path.join(Path(__file__).parent.parent.parent, 'downloads')
-        os.makedirs(download_dir, exist_ok=True)
-        file_path = os.path.join(download_dir, message.document.file_name)
+                sender.reply_to(message, format_saved_text(upload["text"], upload["rows_count"]))
+                if upload["first_item_id"] is not None:
+                    sender.send_text(message.chat.id, "Обновляю цены по ссылкам из файла...")
+                    refresh_stats = refresh_prices(upload["first_item_id"], upload["last_item_id"])
+                    sender.send_text(message.chat.id, format_refresh_summary(refresh_stats))
+                    sender.send_text(message.chat.id,
+                                     format_upload_prices(upload["first_item_id"], upload["last_item_id"]))
+                sender.send_text(message.chat.id, CRAWL_START_TEXT)
+                crawl_stats = run_crawl()
+                sender.send_text(message.chat.id, format_crawl_summary(crawl_stats))
 
-        try:
-            with open(file_path, 'wb') as new_file:
-                new_file.write(downloaded_file)
-            logger.info(f"Файл успешно сохранен: {file_path}")
-
-            # Обработка данных
-            data = get_data_file(file_path)  # Используйте file_path для получения данных
-            text = get_text(data)
-            insert_data_bd(data)
-            bot.reply_to(message, f"Файл сохранен!\n\n{text}")
-            bot.send_message(message.chat.id, "Сейчас проанализирую стоимость телефонов на www.onlinetrade.ru\n"
-                                              "Подождите немного")
-            data_parser_online_trade = parser_online_trade()
-            average_cost_phone = round(data_parser_online_trade['total_price'] / data_parser_online_trade['total_products'], 2)
-            bot.send_message(message.chat.id,
-                             f"Данные с парсинга страницы:\n"
-                             f"Общее кол-во телефонов этой марки: {data_parser_online_trade['total_products']}\n"
-                             f"Средняя стоимость телефона {average_cost_phone}")
+                report_path = build_report(upload, crawl_stats, REPORT_FORMAT)
+                sender.send_document(message.chat.id, report_path, remove_after=True,
+                                     caption="Отчет по загруженным данным")
+            if profile:
+                sender.send_text(message.chat.id, format_profile_summary(profile))
         except Exception as e:
             logger.error(f"Ошибка: {str(e)}")
-            bot.reply_to(message, f"Ошибка: {str(e)}")
-
-    @bot.message_handler(content_types=["text"])
-    def handler_some_text(message: types.Message):
-        """Обработка текстовых сообщений."""
-        bot.send_message(
-            message.chat.id,
-            "Пожалуйста, загрузите файл в формате Excel (.xlsx)"
-        )
+            sender.reply_to(message, format_upload_error(e))
 
     @bot.message_handler(commands=['start'])
     def handler_start(message: telebot.types.Message) -> None:
@@ -76,7 +183,7 @@ def handler_excel_document(bot):
 
         try:
             logger.info(f"Новый пользователь: {message.from_user.id}")
-            bot.send_message(
+            sender.send_text(
                 message.chat.id,
                 "Загрузите Excel-файл в формате .xlsx\n"
                 "Убедитесь, что файл содержит колонки:\n"
@@ -84,7 +191,36 @@ def handler_excel_document(bot):
             )
         except Exception as exp:
             logger.error(f"Ошибка в обработчике /start: {str(exp)}", exc_info=True)
-            bot.send_message(
+            sender.send_text(
                 message.chat.id,
                 "Произошла внутренняя ошибка. Попробуйте позже."
-            )
\ No newline at end of file
+            )
+
+    @bot.message_handler(commands=['refresh'])
+    def handler_refresh(message: types.Message) -> None:
+        """
+        Обработчик команды /refresh: обновляет цены всех сохраненных строк по xpath.
+        Загружает ссылки из таблиц всех пользователей, поэтому доступен только администратору.
+        """
+        if not is_admin(message.from_user.id):
+            sender.send_text(message.chat.id, "Команда доступна только администратору")
+            return
+        try:
+            sender.send_text(message.chat.id, "Обновляю цены по всем сохраненным ссылкам...")
+            with profile_job("refresh") as profile:
+                stats = refresh_prices()
+            sender.send_text(message.chat.id, format_refresh_summary(stats))
+            if profile:
+                sender.send_text(message.chat.id, format_profile_summary(profile))
+        except Exception as exp:
+            logger.error(f"Ошибка в обработчике /refresh: {str(exp)}", exc_info=True)
+            sender.send_text(message.chat.id, "Не удалось обновить цены. Попробуйте позже.")
+
+    # Обработчик любого текста регистрируется последним, иначе он перехватывает команды
+    @bot.message_handler(content_types=["text"])
+    def handler_some_text(message: types.Message):
+        """Обработка текстовых сообщений."""
+        sender.send_text(
+            message.chat.id,
+            "Пожалуйста, загрузите файл в формате Excel (.xlsx)"
+        )
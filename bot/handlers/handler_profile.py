@@ -0,0 +1,45 @@
+"""
+Команда администратора /profile on|off: включает профилирование следующих заданий
+(загрузка файла, /refresh). Администраторы задаются переменной BOT_ADMINS.
+"""
+
+import logging
+
+from telebot import types
+
+from auth.admins import is_admin
+from handlers.handler_search import get_command_argument
+from logs.logging_config import setup_logging
+from profiling.profiler import is_enabled, set_enabled
+
+logger = logging.getLogger(__name__)
+setup_logging()
+
+
+def profile_command_reply(message: types.Message) -> str:
+    """Выполняет команду /profile и возвращает текст ответа."""
+    if not is_admin(message.from_user.id):
+        logger.warning(f"Пользователь {message.from_user.id} без прав вызвал /profile")
+        return "Команда доступна только администратору"
+
+    argument = get_command_argument(message).lower()
+    if argument in ("on", "off"):
+        set_enabled(argument == "on")
+    elif argument:
+        return "Использование: /profile on|off"
+    return ("Профилирование включено: профиль и время этапов будут отправлены после задания"
+            if is_enabled() else "Профилирование выключено")
+
+
+def handler_profile(bot, sender):
+    @bot.message_handler(commands=['profile'])
+    def handler_profile_command(message: types.Message) -> None:
+        """Обработчик команды /profile."""
+        sender.send_text(message.chat.id, profile_command_reply(message))
+
+
+def handler_profile_async(bot, sender):
+    @bot.message_handler(commands=['profile'])
+    async def handler_profile_command(message: types.Message) -> None:
+        """Обработчик команды /profile."""
+        sender.send_text(message.chat.id, profile_command_reply(message))
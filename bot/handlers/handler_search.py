@@ -0,0 +1,179 @@
+"""
+Команды поиска по сохраненному каталогу: /search <текст> и /stats <название>.
+Регистрируются раньше обработчика произвольного текста.
+"""
+
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from telebot import types
+
+from database.queries import get_title_stats, search_items
+from logs.logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
+setup_logging()
+
+# Поисковые запросы по короткому ключу из callback_data кнопки "Далее":
+# запрос целиком может не поместиться в 64 байта callback_data
+MAX_STORED_QUERIES = 1000
+_search_queries: "OrderedDict[str, str]" = OrderedDict()
+# Обработчики TeleBot выполняются в нескольких потоках
+_search_queries_lock = threading.Lock()
+
+
+def get_command_argument(message: types.Message) -> str:
+    """Возвращает текст после команды: '/search redmi note' -> 'redmi note'."""
+    parts = message.text.split(maxsplit=1)
+    return parts[1].strip() if len(parts) > 1 else ""
+
+
+def format_search_results(query: str, items: List[dict]) -> str:
+    if not items:
+        return f"По запросу «{query}» ничего не найдено"
+    lines = [f"Результаты поиска «{query}»:"]
+    for item in items:
+        price = f"{item['price']} ₽" if item["price"] is not None else "цена не обновлялась"
+        lines.append(f"{item['id']}. {item['title']} — {price}\n{item['url']}")
+    return "\n\n".join(lines)
+
+
+def remember_query(query: str) -> str:
+    """Сохраняет поисковый запрос и возвращает его ключ для callback_data."""
+    key = hashlib.blake2s(query.encode(), digest_size=6).hexdigest()
+    with _search_queries_lock:
+        _search_queries[key] = query
+        _search_queries.move_to_end(key)
+        while len(_search_queries) > MAX_STORED_QUERIES:
+            _search_queries.popitem(last=False)
+    return key
+
+
+def parse_search_callback(data: str) -> Optional[Tuple[str, int]]:
+    """
+    Разбирает callback_data 'search:<ключ запроса>:<after_id>'.
+
+    Returns:
+        Tuple: Запрос и after_id; None, если запрос уже не хранится
+    """
+    parts = data.split(":")
+    if len(parts) != 3 or not parts[2].isdigit():
+        return None
+    with _search_queries_lock:
+        query = _search_queries.get(parts[1])
+    return (query, int(parts[2])) if query is not None else None
+
+
+def search_keyboard(query: str, next_after_id: Optional[int]) -> Optional[types.InlineKeyboardMarkup]:
+    if next_after_id is None:
+        return None
+    keyboard = types.InlineKeyboardMarkup()
+    keyboard.add(types.InlineKeyboardButton(
+        "Далее", callback_data=f"search:{remember_query(query)}:{next_after_id}"
+    ))
+    return keyboard
+
+
+def format_title_stats(title: str, stats: Optional[dict]) -> str:
+    if stats is None:
+        return f"Товары с названием «{title}» не найдены"
+    text = (f"Статистика «{title}»:\n"
+            f"Записей: {stats['items']}, ссылок: {stats['urls']}\n")
+    if stats["avg_price"] is None:
+        return text + "Цены еще не обновлялись (команда /refresh)"
+    return text + (f"Цена: от {stats['min_price']} до {stats['max_price']}, "
+                   f"средняя {round(stats['avg_price'], 2)}\n"
+                   f"Обновлено: {stats['updated_at']}\n"
+                   f"Точек в истории цен: {stats['history_points']} "
+                   f"(от {stats['history_min_price']} до {stats['history_max_price']})")
+
+
+def handler_search(bot, sender):
+    @bot.message_handler(commands=['search'])
+    def handler_search_command(message: types.Message) -> None:
+        """Обработчик команды /search: полнотекстовый поиск по названиям."""
+        query = get_command_argument(message)
+        if not query:
+            sender.send_text(message.chat.id, "Укажите текст для поиска: /search redmi note")
+            return
+        try:
+            items, next_after_id = search_items(query)
+            sender.send_text(message.chat.id, format_search_results(query, items),
+                             reply_markup=search_keyboard(query, next_after_id))
+        except Exception as exp:
+            logger.error(f"Ошибка в обработчике /search: {str(exp)}", exc_info=True)
+            sender.send_text(message.chat.id, "Ошибка поиска. Попробуйте позже.")
+
+    @bot.callback_query_handler(func=lambda call: call.data.startswith("search:"))
+    def handler_search_next(call: types.CallbackQuery) -> None:
+        """Следующая страница результатов поиска."""
+        bot.answer_callback_query(call.id)
+        parsed = parse_search_callback(call.data)
+        if parsed is None:
+            sender.send_text(call.message.chat.id, "Повторите поиск командой /search")
+            return
+        query, after_id = parsed
+        items, next_after_id = search_items(query, after_id=after_id)
+        sender.send_text(call.message.chat.id, format_search_results(query, items),
+                         reply_markup=search_keyboard(query, next_after_id))
+
+    @bot.message_handler(commands=['stats'])
+    def handler_stats_command(message: types.Message) -> None:
+        """Обработчик команды /stats: статистика цен по названию товара."""
+        title = get_command_argument(message)
+        if not title:
+            sender.send_text(message.chat.id, "Укажите название товара: /stats <название>")
+            return
+        try:
+            sender.send_text(message.chat.id, format_title_stats(title, get_title_stats(title)))
+        except Exception as exp:
+            logger.error(f"Ошибка в обработчике /stats: {str(exp)}", exc_info=True)
+            sender.send_text(message.chat.id, "Ошибка получения статистики. Попробуйте позже.")
+
+
+def handler_search_async(bot, sender):
+    @bot.message_handler(commands=['search'])
+    async def handler_search_command(message: types.Message) -> None:
+        """Обработчик команды /search: полнотекстовый поиск по названиям."""
+        query = get_command_argument(message)
+        if not query:
+            sender.send_text(message.chat.id, "Укажите текст для поиска: /search redmi note")
+            return
+        try:
+            items, next_after_id = await asyncio.to_thread(search_items, query)
+            sender.send_text(message.chat.id, format_search_results(query, items),
+                             reply_markup=search_keyboard(query, next_after_id))
+        except Exception as exp:
+            logger.error(f"Ошибка в обработчике /search: {str(exp)}", exc_info=True)
+            sender.send_text(message.chat.id, "Ошибка поиска. Попробуйте позже.")
+
+    @bot.callback_query_handler(func=lambda call: call.data.startswith("search:"))
+    async def handler_search_next(call: types.CallbackQuery) -> None:
+        """Следующая страница результатов поиска."""
+        await bot.answer_callback_query(call.id)
+        parsed = parse_search_callback(call.data)
+        if parsed is None:
+            sender.send_text(call.message.chat.id, "Повторите поиск командой /search")
+            return
+        query, after_id = parsed
+        items, next_after_id = await asyncio.to_thread(search_items, query, after_id)
+        sender.send_text(call.message.chat.id, format_search_results(query, items),
+                         reply_markup=search_keyboard(query, next_after_id))
+
+    @bot.message_handler(commands=['stats'])
+    async def handler_stats_command(message: types.Message) -> None:
+        """Обработчик команды /stats: статистика цен по названию товара."""
+        title = get_command_argument(message)
+        if not title:
+            sender.send_text(message.chat.id, "Укажите название товара: /stats <название>")
+            return
+        try:
+            stats = await asyncio.to_thread(get_title_stats, title)
+            sender.send_text(message.chat.id, format_title_stats(title, stats))
+        except Exception as exp:
+            logger.error(f"Ошибка в обработчике /stats: {str(exp)}", exc_info=True)
+            sender.send_text(message.chat.id, "Ошибка получения статистики. Попробуйте позже.")
@@ -0,0 +1,265 @@
+"""
+Очередь исходящих сообщений бота с учетом ограничений Telegram.
+
+Сообщения отправляются фоновыми потоками с ограничением частоты через token bucket:
+общий на бота и отдельный на каждый чат. Ответ 429 приостанавливает чат на retry_after
+секунд без повторных запросов. Длинные тексты делятся по границам записей,
+а короткие сообщения, накопившиеся в очереди чата, объединяются в одно.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from telebot.apihelper import ApiTelegramException
+
+from logs.logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
+setup_logging()
+
+# Ограничение Telegram на длину одного сообщения
+MAX_MESSAGE_LENGTH = 4096
+# Разделитель записей в текстах бота (см. text_handler.get_text)
+RECORD_SEPARATOR = "\n\n"
+
+GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", 25))
+CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", 1))
+CHAT_BURST = int(os.getenv("SEND_CHAT_BURST", 3))
+SENDER_THREADS = int(os.getenv("SENDER_THREADS", 4))
+
+
+class TokenBucket:
+    """Token bucket: rate токенов в секунду, не больше capacity накопленных."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self) -> float:
+        """Сколько секунд ждать до появления токена (0 - токен есть)."""
+        with self._lock:
+            self._refill()
+            return max(0.0, (1 - self._tokens) / self.rate)
+
+    def is_full(self) -> bool:
+        """Накоплено capacity токенов: bucket ничем не отличается от нового."""
+        with self._lock:
+            self._refill()
+            return self._tokens >= self.capacity
+
+    def reserve(self) -> float:
+        """Забирает токен в долг и возвращает, сколько секунд нужно подождать до отправки."""
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate)
+
+
+def split_message(text: str, limit: int = MAX_MESSAGE_LENGTH,
+                  separators: Tuple[str, ...] = (RECORD_SEPARATOR, "\n")) -> List[str]:
+    """
+    Делит текст на части не длиннее limit: по границам записей, запись длиннее
+    лимита - по строкам, и только слишком длинную строку - по символам.
+    """
+    if len(text) <= limit:
+        return [text]
+    if not separators:
+        return [text[pos:pos + limit] for pos in range(0, len(text), limit)]
+
+    separator, rest = separators[0], separators[1:]
+    chunks = []
+    current = None
+    for piece in text.split(separator):
+        candidate = piece if current is None else f"{current}{separator}{piece}"
+        if len(candidate) <= limit:
+            current = candidate
+            continue
+        if current is not None:
+            chunks.append(current)
+        if len(piece) <= limit:
+            current = piece
+        else:
+            parts = split_message(piece, limit, rest)
+            chunks.extend(parts[:-1])
+            current = parts[-1]
+    if current is not None:
+        chunks.append(current)
+    return chunks
+
+
+def pack_messages(texts: List[str], limit: int = MAX_MESSAGE_LENGTH) -> List[str]:
+    """Объединяет короткие тексты в сообщения не длиннее limit, длинные - делит."""
+    packed = []
+    for text in texts:
+        for chunk in split_message(text, limit):
+            if packed and len(packed[-1]) + len(RECORD_SEPARATOR) + len(chunk) <= limit:
+                packed[-1] = f"{packed[-1]}{RECORD_SEPARATOR}{chunk}"
+            else:
+                packed.append(chunk)
+    return packed
+
+
+@dataclass
+class OutgoingMessage:
+    """Элемент очереди чата: текст или документ."""
+    text: Optional[str] = None
+    document_path: Optional[str] = None
+    remove_after: bool = False
+    kwargs: dict = field(default_factory=dict)
+
+    @property
+    def mergeable(self) -> bool:
+        # С другими сообщениями объединяются только простые тексты без reply/клавиатуры
+        return self.text is not None and not self.kwargs
+
+
+class MessageSender:
+    """
+    Отправитель сообщений. Методы send_* только ставят сообщение в очередь
+    и сразу возвращают управление, поэтому их можно вызывать из любых потоков
+    и из асинхронных обработчиков. Порядок сообщений внутри чата сохраняется.
+    """
+
+    def __init__(self, bot, threads: int = SENDER_THREADS):
+        self.bot = bot
+        self.global_bucket = TokenBucket(GLOBAL_RATE, GLOBAL_RATE)
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+        self._queues: Dict[int, Deque[OutgoingMessage]] = {}
+        self._ready_at: Dict[int, float] = {}
+        self._busy: Set[int] = set()
+        self._cond = threading.Condition()
+        for num in range(threads):
+            threading.Thread(target=self._worker, name=f"sender-{num}", daemon=True).start()
+
+    def send_text(self, chat_id: int, text: str, **kwargs) -> None:
+        """
+        Ставит текст в очередь; длинный текст делится на части по границам записей.
+        Пустой текст (Telegram его не принимает) не отправляется.
+        """
+        chunks = [chunk for chunk in split_message(text or "") if chunk.strip()]
+        if not chunks:
+            logger.warning(f"Пустое сообщение в чат {chat_id} не отправлено")
+            return
+        # reply_to_message_id, клавиатура и т.п. относятся к первой части
+        items = [OutgoingMessage(text=chunks[0], kwargs=kwargs)]
+        items += [OutgoingMessage(text=chunk) for chunk in chunks[1:]]
+        self._enqueue(chat_id, items)
+
+    def reply_to(self, message, text: str, **kwargs) -> None:
+        self.send_text(message.chat.id, text, reply_to_message_id=message.message_id, **kwargs)
+
+    def send_document(self, chat_id: int, document_path: str, remove_after: bool = False, **kwargs) -> None:
+        """Ставит файл в очередь; remove_after - удалить файл после отправки."""
+        self._enqueue(chat_id, [OutgoingMessage(document_path=document_path, remove_after=remove_after,
+                                                kwargs=kwargs)])
+
+    def _enqueue(self, chat_id: int, items: List[OutgoingMessage]) -> None:
+        with self._cond:
+            self._queues.setdefault(chat_id, deque()).extend(items)
+            self._cond.notify()
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        if chat_id not in self._chat_buckets:
+            self._chat_buckets[chat_id] = TokenBucket(CHAT_RATE, CHAT_BURST)
+        return self._chat_buckets[chat_id]
+
+    def _is_idle(self, chat_id: int, now: float) -> bool:
+        """
+        Чату нечего отправлять, и его состояние совпадает с состоянием нового чата:
+        очередь пуста, пауза 429 истекла, bucket полон. Вызывается под блокировкой.
+        """
+        if self._queues[chat_id] or chat_id in self._busy or self._ready_at.get(chat_id, 0.0) > now:
+            return False
+        bucket = self._chat_buckets.get(chat_id)
+        return bucket is None or bucket.is_full()
+
+    def _take_next(self) -> Tuple[int, OutgoingMessage]:
+        """Ждет чат, которому можно отправить сообщение, и забирает из его очереди порцию."""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                # Записи неактивных чатов удаляются, чтобы словари не росли с числом чатов
+                for chat_id in [chat_id for chat_id in self._queues if self._is_idle(chat_id, now)]:
+                    del self._queues[chat_id]
+                    self._chat_buckets.pop(chat_id, None)
+                    self._ready_at.pop(chat_id, None)
+
+                ready_chat, wake_at = None, None
+                for chat_id, queue in self._queues.items():
+                    if not queue or chat_id in self._busy:
+                        continue
+                    ready_at = max(self._ready_at.get(chat_id, 0.0), now + self._chat_bucket(chat_id).delay())
+                    if ready_at <= now:
+                        ready_chat = chat_id
+                        break
+                    wake_at = ready_at if wake_at is None else min(wake_at, ready_at)
+
+                if ready_chat is not None:
+                    break
+                self._cond.wait(None if wake_at is None else wake_at - now)
+
+            queue = self._queues[ready_chat]
+            item = queue.popleft()
+            if item.mergeable:
+                # Объединяем накопившиеся в очереди чата короткие тексты
+                texts = [item.text]
+                while queue and queue[0].mergeable:
+                    texts.append(queue.popleft().text)
+                packed = pack_messages(texts)
+                item = OutgoingMessage(text=packed[0])
+                queue.extendleft(OutgoingMessage(text=text) for text in reversed(packed[1:]))
+
+            self._chat_bucket(ready_chat).reserve()
+            self._busy.add(ready_chat)
+            return ready_chat, item
+
+    def _worker(self) -> None:
+        while True:
+            chat_id, item = self._take_next()
+            try:
+                time.sleep(self.global_bucket.reserve())
+                self._deliver(chat_id, item)
+            except ApiTelegramException as e:
+                if e.error_code == 429:
+                    retry_after = (e.result_json or {}).get("parameters", {}).get("retry_after", 5)
+                    logger.warning(f"Лимит Telegram для чата {chat_id}: пауза {retry_after} сек")
+                    with self._cond:
+                        self._ready_at[chat_id] = time.monotonic() + retry_after
+                        self._queues[chat_id].appendleft(item)
+                    continue
+                logger.error(f"Сообщение в чат {chat_id} не отправлено: {str(e)}")
+                self._cleanup(item)
+            except Exception as e:
+                logger.error(f"Сообщение в чат {chat_id} не отправлено: {str(e)}", exc_info=True)
+                self._cleanup(item)
+            else:
+                self._cleanup(item)
+            finally:
+                with self._cond:
+                    self._busy.discard(chat_id)
+                    self._cond.notify_all()
+
+    def _deliver(self, chat_id: int, item: OutgoingMessage) -> None:
+        if item.document_path is None:
+            self.bot.send_message(chat_id, item.text, **item.kwargs)
+            return
+        with open(item.document_path, 'rb') as document:
+            self.bot.send_document(chat_id, document, **item.kwargs)
+
+    @staticmethod
+    def _cleanup(item: OutgoingMessage) -> None:
+        if item.remove_after and item.document_path and os.path.exists(item.document_path):
+            os.remove(item.document_path)
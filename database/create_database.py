@@ -1,6 +1,7 @@
 """В модуле создаются таблицы."""
 import sqlite3
 from database.db_manager import Database
+from database.insert_data import normalize_title
 from logs.logging_config import setup_logging
 import logging
 
@@ -20,6 +21,92 @@ def create_tables():
                         url TEXT,
                         xpath TEXT
                     )''')
+                # Колонки цены добавлены позже - дополняем существующие базы
+                columns = {row["name"] for row in db.connection.execute("PRAGMA table_info(zyuzlik)")}
+                if "price" not in columns:
+                    db.connection.execute("ALTER TABLE zyuzlik ADD COLUMN price INTEGER")
+                if "price_updated_at" not in columns:
+                    db.connection.execute("ALTER TABLE zyuzlik ADD COLUMN price_updated_at TEXT")
+                if "title_lower" not in columns:
+                    # Название в нижнем регистре для /stats; заполняется в Python,
+                    # так как lower() и NOCASE в SQLite не меняют регистр кириллицы
+                    db.connection.execute("ALTER TABLE zyuzlik ADD COLUMN title_lower TEXT")
+                    rows = db.connection.execute("SELECT id, title FROM zyuzlik").fetchall()
+                    db.connection.executemany(
+                        "UPDATE zyuzlik SET title_lower = ? WHERE id = ?",
+                        [(normalize_title(row["title"]), row["id"]) for row in rows]
+                    )
+                db.connection.execute("CREATE INDEX IF NOT EXISTS idx_zyuzlik_url ON zyuzlik (url)")
+                db.connection.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_zyuzlik_title_lower ON zyuzlik (title_lower)"
+                )
+
+                # Полнотекстовый индекс по title, синхронизируется триггерами
+                fts_exists = db.connection.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'zyuzlik_fts'"
+                ).fetchone()
+                db.connection.execute('''
+                    CREATE VIRTUAL TABLE IF NOT EXISTS zyuzlik_fts
+                    USING fts5(title, content='zyuzlik', content_rowid='id')''')
+                db.connection.execute('''
+                    CREATE TRIGGER IF NOT EXISTS zyuzlik_fts_insert AFTER INSERT ON zyuzlik BEGIN
+                        INSERT INTO zyuzlik_fts (rowid, title) VALUES (new.id, new.title);
+                    END''')
+                db.connection.execute('''
+                    CREATE TRIGGER IF NOT EXISTS zyuzlik_fts_delete AFTER DELETE ON zyuzlik BEGIN
+                        INSERT INTO zyuzlik_fts (zyuzlik_fts, rowid, title) VALUES ('delete', old.id, old.title);
+                    END''')
+                db.connection.execute('''
+                    CREATE TRIGGER IF NOT EXISTS zyuzlik_fts_update AFTER UPDATE OF title ON zyuzlik BEGIN
+                        INSERT INTO zyuzlik_fts (zyuzlik_fts, rowid, title) VALUES ('delete', old.id, old.title);
+                        INSERT INTO zyuzlik_fts (rowid, title) VALUES (new.id, new.title);
+                    END''')
+                if not fts_exists:
+                    # Индексируем строки, сохраненные до появления полнотекстового поиска
+                    db.connection.execute("INSERT INTO zyuzlik_fts (zyuzlik_fts) VALUES ('rebuild')")
+                db.connection.execute('''
+                    CREATE TABLE IF NOT EXISTS price_history (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        item_id INTEGER NOT NULL REFERENCES zyuzlik(id),
+                        price INTEGER,
+                        fetched_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+                    )''')
+                db.connection.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_price_history_item ON price_history (item_id, fetched_at)"
+                )
+                db.connection.execute('''
+                    CREATE TABLE IF NOT EXISTS uploads (
+                        sha256 TEXT PRIMARY KEY,
+                        file_unique_id TEXT,
+                        file_path TEXT NOT NULL,
+                        size INTEGER NOT NULL,
+                        rows_count INTEGER NOT NULL,
+                        first_item_id INTEGER,
+                        last_item_id INTEGER,
+                        text TEXT,
+                        created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+                    )''')
+                db.connection.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_uploads_file_unique_id ON uploads (file_unique_id)"
+                )
+                db.connection.execute('''
+                    CREATE TABLE IF NOT EXISTS snapshots (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        crawl_id TEXT NOT NULL,
+                        url TEXT NOT NULL,
+                        fetched_at REAL NOT NULL,
+                        path TEXT NOT NULL,
+                        codec TEXT NOT NULL,
+                        size INTEGER NOT NULL,
+                        compressed_size INTEGER NOT NULL,
+                        kind TEXT NOT NULL DEFAULT 'catalog'
+                    )''')
+                db.connection.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_snapshots_crawl ON snapshots (crawl_id, fetched_at)"
+                )
+                db.connection.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_snapshots_url ON snapshots (url, fetched_at)"
+                )
 
             logger.info("Все таблицы успешно созданы")
 
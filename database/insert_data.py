@@ -1,14 +1,31 @@
 import logging
 import pandas
+from typing import Optional, Tuple
+
 from database.db_manager import Database
 from logs.logging_config import setup_logging
+from profiling.profiler import stage
 
 logger = logging.getLogger(__name__)
 setup_logging()
 
 
-def insert_data_bd(data: pandas) -> None:
-    """Вставляет данные из DataFrame в таблицу zyuzlik."""
+def normalize_title(title) -> str:
+    """
+    Название для сравнения без учета регистра (колонка title_lower).
+    COLLATE NOCASE в SQLite приводит к нижнему регистру только латиницу,
+    поэтому регистр кириллических названий приводится в Python.
+    """
+    return str(title).lower()
+
+
+def insert_data_bd(data: pandas) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Вставляет данные из DataFrame в таблицу zyuzlik.
+
+    Returns:
+        Tuple: id первой и последней вставленной записи (None, None если данных нет)
+    """
     try:
         # Проверка наличия необходимых колонок в данных
         required_columns = {'title', 'url', 'xpath'}
@@ -17,21 +34,26 @@ def insert_data_bd(data: pandas) -> None:
             logger.error(f"Отсутствуют обязательные колонки: {missing}")
             raise ValueError(f"Отсутствуют колонки: {missing}")
 
-        with Database() as db:
+        with stage("sqlite"), Database() as db:
             with db.connection:
                 cursor = db.connection.cursor()
                 # Конвертация DataFrame в список кортежей для пакетной вставки
                 data_tuples = [
-                    (row['title'], row['url'], row['xpath'])
+                    (row['title'], normalize_title(row['title']), row['url'], row['xpath'])
                     for _, row in data.iterrows()
                 ]
                 # Пакетная вставка данных
                 cursor.executemany('''
-                    INSERT INTO zyuzlik (title, url, xpath)
-                    VALUES (?, ?, ?)
+                    INSERT INTO zyuzlik (title, title_lower, url, xpath)
+                    VALUES (?, ?, ?, ?)
                 ''', data_tuples)
                 inserted_rows = cursor.rowcount
                 logger.info(f"Успешно импортировано {inserted_rows} записей")
+                if not data_tuples:
+                    return None, None
+                # Пакетная вставка идет в одной транзакции, поэтому id записей идут подряд
+                last_id = cursor.execute("SELECT last_insert_rowid()").fetchone()[0]
+                return last_id - len(data_tuples) + 1, last_id
     except Exception as e:
         logger.error(f"Ошибка импорта данных: {str(e)}")
         raise
@@ -0,0 +1,84 @@
+"""Запросы чтения каталога: полнотекстовый поиск и статистика по названию."""
+import logging
+from typing import List, Optional, Tuple
+
+from database.db_manager import Database
+from database.insert_data import normalize_title
+from logs.logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
+setup_logging()
+
+PAGE_SIZE = 10
+
+
+def build_match_query(text: str) -> Optional[str]:
+    """
+    Преобразует пользовательский текст в запрос FTS5: каждое слово ищется по префиксу,
+    спецсимволы синтаксиса FTS5 экранируются кавычками.
+    """
+    terms = [term.replace('"', '""') for term in text.split()]
+    if not terms:
+        return None
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def search_items(text: str, after_id: int = 0, limit: int = PAGE_SIZE) -> Tuple[List[dict], Optional[int]]:
+    """
+    Ищет товары по названию с keyset-пагинацией по id.
+
+    Args:
+        text: Поисковая строка
+        after_id: id последней записи предыдущей страницы (0 - первая страница)
+        limit: Размер страницы
+
+    Returns:
+        Tuple: Записи страницы и after_id для следующей страницы (None, если страниц больше нет)
+    """
+    match_query = build_match_query(text)
+    if match_query is None:
+        return [], None
+
+    with Database() as db:
+        # Берем на одну запись больше, чтобы узнать, есть ли следующая страница
+        rows = db.connection.execute('''
+            SELECT z.id, z.title, z.url, z.price
+            FROM zyuzlik_fts AS f
+            JOIN zyuzlik AS z ON z.id = f.rowid
+            WHERE zyuzlik_fts MATCH ? AND f.rowid > ?
+            ORDER BY f.rowid
+            LIMIT ?
+        ''', (match_query, after_id, limit + 1)).fetchall()
+
+    items = [dict(row) for row in rows[:limit]]
+    next_after_id = items[-1]["id"] if len(rows) > limit else None
+    logger.info(f"Поиск '{text}': найдено на странице {len(items)}")
+    return items, next_after_id
+
+
+def get_title_stats(title: str) -> Optional[dict]:
+    """Возвращает статистику цен по товарам с указанным названием (без учета регистра)."""
+    title_lower = normalize_title(title)
+    with Database() as db:
+        items = db.connection.execute('''
+            SELECT COUNT(*) AS items, COUNT(DISTINCT url) AS urls,
+                   MIN(price) AS min_price, MAX(price) AS max_price, AVG(price) AS avg_price,
+                   MAX(price_updated_at) AS updated_at
+            FROM zyuzlik
+            WHERE title_lower = ?
+        ''', (title_lower,)).fetchone()
+        if not items["items"]:
+            return None
+        history = db.connection.execute('''
+            SELECT COUNT(*) AS points, MIN(h.price) AS min_price, MAX(h.price) AS max_price
+            FROM price_history AS h
+            JOIN zyuzlik AS z ON z.id = h.item_id
+            WHERE z.title_lower = ?
+        ''', (title_lower,)).fetchone()
+
+    return {
+        **dict(items),
+        "history_points": history["points"],
+        "history_min_price": history["min_price"],
+        "history_max_price": history["max_price"],
+    }
@@ -0,0 +1,37 @@
+"""Учет загруженных файлов и кеш результатов их разбора."""
+import logging
+from typing import Optional
+
+from database.db_manager import Database
+from logs.logging_config import setup_logging
+from profiling.profiler import stage
+
+logger = logging.getLogger(__name__)
+setup_logging()
+
+
+def get_upload(sha256: Optional[str] = None, file_unique_id: Optional[str] = None) -> Optional[dict]:
+    """Ищет ранее обработанный файл по хешу содержимого или file_unique_id Telegram."""
+    if sha256 is None and file_unique_id is None:
+        return None
+    with stage("sqlite"), Database() as db:
+        if sha256 is not None:
+            row = db.connection.execute("SELECT * FROM uploads WHERE sha256 = ?", (sha256,)).fetchone()
+        else:
+            row = db.connection.execute(
+                "SELECT * FROM uploads WHERE file_unique_id = ?", (file_unique_id,)
+            ).fetchone()
+    return dict(row) if row else None
+
+
+def save_upload(upload: dict) -> None:
+    """Сохраняет результат разбора файла."""
+    with stage("sqlite"), Database() as db:
+        with db.connection:
+            db.connection.execute('''
+                INSERT OR IGNORE INTO uploads
+                    (sha256, file_unique_id, file_path, size, rows_count, first_item_id, last_item_id, text)
+                VALUES (:sha256, :file_unique_id, :file_path, :size, :rows_count,
+                        :first_item_id, :last_item_id, :text)
+            ''', upload)
+    logger.info(f"Загрузка {upload['sha256']} сохранена, строк: {upload['rows_count']}")
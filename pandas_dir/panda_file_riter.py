@@ -1,6 +1,7 @@
 import os
 import pandas as pd
 import logging
+from pathlib import Path
 from typing import Optional
 
 from logs.logging_config import setup_logging
@@ -8,13 +9,15 @@ from logs.logging_config import setup_logging
 setup_logging()
 logger = logging.getLogger(__name__)
 
+DOWNLOADS_DIR = os.path.join(Path(__file__).parent.parent, "downloads")
+
 
 def get_data_file(filename: str) -> Optional[pd.DataFrame]:
     """
-    Загружает и валидирует данные из Excel-файла в директории downloads.
+    Загружает и валидирует данные из Excel-файла.
 
     Args:
-        filename (str): Имя файла для загрузки (с расширением)
+        filename (str): Абсолютный путь к файлу или имя файла в директории downloads
 
     Returns:
         pd.DataFrame: DataFrame с данными или None при критической ошибке
@@ -25,19 +28,18 @@ def get_data_file(filename: str) -> Optional[pd.DataFrame]:
         ValueError: Если файл не является валидным Excel-файлом
     """
     try:
-        # Формирование пути к директории
-        downloads_dir = os.path.abspath(os.path.join(os.getcwd(), "downloads"))
         logger.debug("Старт обработки файла: %s", filename)
 
-        # Создание директории при необходимости
-        os.makedirs(downloads_dir, exist_ok=True)
-        logger.info("Директория проверена: %s", downloads_dir)
+        # Абсолютный путь используется как есть, имя файла ищется в downloads проекта
+        if os.path.isabs(filename):
+            file_path = filename
+        else:
+            file_path = os.path.join(DOWNLOADS_DIR, filename)
 
         # Проверка существования файла
-        file_path = os.path.join(downloads_dir, filename)
         if not os.path.isfile(file_path):
             logger.error("Файл не найден по пути: %s", file_path)
-            raise FileNotFoundError(f"Файл {filename} не найден в папке downloads")
+            raise FileNotFoundError(f"Файл {filename} не найден")
 
         # Чтение файла
         logger.info("Начало чтения файла: %s", filename)
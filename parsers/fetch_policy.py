@@ -0,0 +1,272 @@
+"""
+Политика загрузки страниц: повторы с экспоненциальной задержкой и джиттером,
+circuit breaker и адаптивное (AIMD) ограничение параллельности на каждый домен.
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional, TypeVar
+from urllib.parse import urlparse
+
+from logs.logging_config import setup_logging
+from profiling.profiler import stage
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(RuntimeError):
+    """Запрос не выполнен: circuit breaker домена разомкнут."""
+
+
+class NonRetryableError(Exception):
+    """
+    Ошибка, которую бесполезно повторять (например, HTTP 404 или недопустимый URL).
+    Не повторяется и не считается отказом домена в circuit breaker и AIMD-лимите.
+    """
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 30.0) -> float:
+    """Задержка перед повтором: экспонента с полным джиттером (0..base * 2^(attempt-1))."""
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker домена.
+
+    closed - запросы идут; после failure_threshold ошибок подряд переходит в open.
+    open - запросы отклоняются reset_timeout секунд, затем half_open.
+    half_open - пропускается один пробный запрос: успех замыкает, ошибка снова размыкает.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._cond = threading.Condition()
+
+    def _blocked_for(self) -> Optional[float]:
+        """
+        Сколько секунд запросы еще будут отклоняться: 0 - запрос можно выполнить,
+        None - идет пробный запрос, ждем его результата. Вызывается под блокировкой.
+        """
+        if self.state == "open":
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0:
+                return remaining
+            self.state = "half_open"
+            self._probe_in_flight = False
+        if self.state == "half_open" and self._probe_in_flight:
+            return None
+        return 0.0
+
+    def allow(self) -> bool:
+        """Разрешает запрос; в состоянии half_open разрешенный запрос становится пробным."""
+        with self._cond:
+            if self._blocked_for() != 0.0:
+                return False
+            if self.state == "half_open":
+                self._probe_in_flight = True
+            return True
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Ждет не дольше timeout секунд, пока breaker начнет пропускать запросы.
+        Разрешение не занимается: после ожидания нужно вызвать allow().
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                blocked_for = self._blocked_for()
+                if blocked_for == 0.0:
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining if blocked_for is None else min(blocked_for, remaining))
+
+    def record_success(self) -> None:
+        with self._cond:
+            self.state = "closed"
+            self._failures = 0
+            self._probe_in_flight = False
+            self._cond.notify_all()
+
+    def record_failure(self) -> None:
+        with self._cond:
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.warning(f"Circuit breaker разомкнут после {self._failures} ошибок")
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+            self._cond.notify_all()
+
+
+class AIMDLimiter:
+    """
+    Ограничитель параллельности по схеме AIMD.
+
+    Успешный запрос быстрее target_latency увеличивает лимит примерно на 1 за каждые
+    limit успешных запросов; ошибка или медленный ответ умножают лимит на decrease_factor,
+    но не чаще раза в decrease_interval секунд: одновременные ошибки одной волны
+    запросов снижают лимит один раз.
+    """
+
+    def __init__(self, initial: int = 4, min_limit: int = 1, max_limit: int = 16,
+                 target_latency: float = 60.0, decrease_factor: float = 0.5,
+                 decrease_interval: float = 10.0):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.decrease_factor = decrease_factor
+        self.decrease_interval = decrease_interval
+        self._in_flight = 0
+        self._last_decrease: Optional[float] = None
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self._in_flight >= int(self.limit):
+                self._cond.wait()
+            self._in_flight += 1
+
+    def cancel(self) -> None:
+        """Освобождает слот, который не был использован для запроса; лимит не меняется."""
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def release(self, latency: float, ok: bool) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            now = time.monotonic()
+            if ok and latency <= self.target_latency:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            elif self._last_decrease is None or now - self._last_decrease >= self.decrease_interval:
+                self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                self._last_decrease = now
+                logger.info(f"Лимит параллельности снижен до {int(self.limit)} "
+                            f"(ok={ok}, задержка {latency:.1f} сек)")
+            self._cond.notify_all()
+
+
+def new_limiter() -> AIMDLimiter:
+    """AIMD-лимитер домена с настройками из переменных окружения."""
+    return AIMDLimiter(
+        initial=int(os.getenv("FETCH_INITIAL_CONCURRENCY", 4)),
+        max_limit=int(os.getenv("FETCH_MAX_CONCURRENCY", 16)),
+        target_latency=float(os.getenv("FETCH_TARGET_LATENCY", 60)),
+        decrease_interval=float(os.getenv("FETCH_DECREASE_INTERVAL", 10)),
+    )
+
+
+class FetchPolicy:
+    """
+    Выполняет загрузку страницы с учетом повторов, circuit breaker и AIMD-лимита.
+
+    Breaker и лимитер у каждого домена свои: ошибки одного сайта не замедляют другие.
+    Пока breaker домена разомкнут, страница не отбрасывается, а ждет его восстановления
+    (не дольше breaker_wait секунд); ожидание не расходует попытки.
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 2.0, max_delay: float = 30.0,
+                 limiter_factory: Callable[[], AIMDLimiter] = new_limiter, failure_threshold: int = 5,
+                 reset_timeout: float = 60.0, breaker_wait: Optional[float] = None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.limiter_factory = limiter_factory
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.breaker_wait = breaker_wait if breaker_wait is not None else 5 * reset_timeout
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._limiters: Dict[str, AIMDLimiter] = {}
+        self._lock = threading.Lock()
+
+    def breaker_for(self, url: str) -> CircuitBreaker:
+        """Возвращает circuit breaker домена URL."""
+        domain = urlparse(url).netloc
+        with self._lock:
+            if domain not in self._breakers:
+                self._breakers[domain] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return self._breakers[domain]
+
+    def limiter_for(self, url: str) -> AIMDLimiter:
+        """Возвращает AIMD-лимитер домена URL."""
+        domain = urlparse(url).netloc
+        with self._lock:
+            if domain not in self._limiters:
+                self._limiters[domain] = self.limiter_factory()
+            return self._limiters[domain]
+
+    def _acquire(self, url: str, breaker: CircuitBreaker, limiter: AIMDLimiter, deadline: float) -> None:
+        """
+        Ждет, пока breaker домена пропустит запрос, и занимает слот AIMD-лимитера домена.
+
+        Raises:
+            CircuitOpenError: Если breaker не восстановился до deadline
+        """
+        while True:
+            with stage("breaker_wait"):
+                if not breaker.wait(deadline - time.monotonic()):
+                    raise CircuitOpenError(f"Circuit breaker разомкнут для {urlparse(url).netloc}")
+            with stage("fetch_slot_wait"):
+                limiter.acquire()
+            # Пока поток ждал слот, breaker мог разомкнуться: проверяем его еще раз уже со слотом
+            if breaker.allow():
+                return
+            limiter.cancel()
+
+    def call(self, url: str, func: Callable[..., T], *args, **kwargs) -> T:
+        """
+        Вызывает func(*args, **kwargs) для загрузки url по политике.
+
+        Raises:
+            CircuitOpenError: Если breaker домена не восстановился за breaker_wait секунд
+            NonRetryableError: Сразу, без повторов
+            Exception: Последняя ошибка func после исчерпания попыток
+        """
+        breaker = self.breaker_for(url)
+        limiter = self.limiter_for(url)
+        deadline = time.monotonic() + self.breaker_wait
+        last_error: Optional[Exception] = None
+
+        for attempt in range(1, self.max_attempts + 1):
+            self._acquire(url, breaker, limiter, deadline)
+            start = time.monotonic()
+            ok = False
+            try:
+                result = func(*args, **kwargs)
+                ok = True
+                breaker.record_success()
+                return result
+            except NonRetryableError as e:
+                # Сайт ответил, но повтор не поможет: это не признак перегрузки домена
+                ok = True
+                breaker.record_success()
+                logger.warning(f"Загрузка {url} неудачна без повторов: {str(e)}")
+                raise
+            except Exception as e:
+                breaker.record_failure()
+                last_error = e
+                logger.warning(f"Попытка {attempt}/{self.max_attempts} загрузки {url} неудачна: {str(e)}")
+            finally:
+                limiter.release(time.monotonic() - start, ok)
+
+            if attempt < self.max_attempts:
+                with stage("fetch_backoff"):
+                    time.sleep(backoff_delay(attempt, self.base_delay, self.max_delay))
+
+        raise last_error
@@ -3,39 +3,53 @@ from typing import Optional
 from queue import Queue
 from logs.logging_config import setup_logging
 from parsers.extract_number import extract_number
+from parsers.fetch_policy import FetchPolicy
 from parsers.selenium_object import get_bs4_with_selenium
+from profiling.profiler import stage
+from snapshots.archive import cleanup_snapshots, new_crawl_id
 from threading import Thread
 
 setup_logging()
 logger = logging.getLogger(__name__)
 
+CATALOG_URL = (
+    "https://www.onlinetrade.ru/catalogue/smartfony-c13/?presets=0&preset_id=0&"
+    "producer%5B0%5D=XIAOMI&price1=5990&price2=156999&diagonal1=6.36&diagonal2=6.88&"
+    "volume_akumm1=4780&volume_akumm2=5500&advanced_search=1&rating_active=0&"
+    "special_active=1&selling_active=1&producer_active=1&price_active=0&os_active=1&"
+    "platform_active=1&volume_mem_active=1&ram_active=1&diagonal_active=1&"
+    "display_razr_active=0&chastota_obnovleniya_active=1&fotokamera_osnovnaya_active=1&"
+    "front_camera_active=1&processor_active=1&phones_type_active=1&slot_dlya_karti_pamyati_active=1&"
+    "fbz_active=1&besprovod_zaryad_active=1&radio_active=1&nfc_active=1&5g_active=1&"
+    "kov_sim_active=1&stepen_zashchiti_active=0&color_active=1&volume_akumm_active=1"
+)
 
-def parser_page(url: str, page_num: int, result_queue: Queue) -> None:
+
+def build_page_url(page_num: Optional[int] = None) -> str:
+    """Формирует URL страницы каталога (без номера страницы - первая страница)."""
+    if page_num is None:
+        return CATALOG_URL
+    return f"{CATALOG_URL}&page={page_num}"
+
+
+def extract_page_stats(bs4object, page_num: int) -> dict:
     """
-    Парсит страницу и добавляет результат в очередь.
+    Считает сумму цен и количество товаров на уже загруженной странице каталога.
 
     Параметры:
-        url (str): URL страницы для загрузки и парсинга,
-        page_num(str): номер страницы который парсим (переменная для логов).
+        bs4object (BeautifulSoup): разобранная страница,
+        page_num (int): номер страницы (переменная для логов).
     Возвращает:
-        None
-
-    Исключения:
-        WebDriverException: Если основной контейнер контента не найден.
-        TimeoutException: Если спиннер не исчезает в течение заданного времени.
-        Exception: При других критических ошибках во время загрузки или парсинга.
+        dict: {"sum_price_product": int, "total_products": int}
     """
     res = {
         "sum_price_product": 0,
         "total_products": 0,
     }
 
-    logger.debug(f"Обрабатывается страница {page_num}")
-
-    bs4object = get_bs4_with_selenium(url)
-
     # Поиск товаров
-    products = bs4object.find_all("div", class_="indexGoods__item")
+    with stage("bs4_find"):
+        products = bs4object.find_all("div", class_="indexGoods__item")
     if not products:
         logger.warning("Товары не найдены на странице")
 
@@ -43,18 +57,92 @@ def parser_page(url: str, page_num: int, result_queue: Queue) -> None:
 
     # Обработка товаров
     for product in products:
-        price_element = product.find("span", class_="price")
+        with stage("bs4_find"):
+            price_element = product.find("span", class_="price")
         if price_element:
             # Получение очищенного числа от возможных символов
-            price = extract_number(str(price_element))
+            with stage("extract_number"):
+                price = extract_number(str(price_element))
             if price:
                 res["sum_price_product"] += price
                 res["total_products"] += 1
 
-    result_queue.put(res)  # Отправляем результат в очередь
+    return res
 
 
-def get_count_page() -> Optional[int]:
+def parse_page(url: str, page_num: int, crawl_id: Optional[str] = None) -> dict:
+    """
+    Загружает страницу каталога и считает сумму цен и количество товаров на ней.
+
+    Параметры:
+        url (str): URL страницы для загрузки и парсинга,
+        page_num (int): номер страницы (переменная для логов),
+        crawl_id (str): идентификатор обхода для архива снимков.
+    Возвращает:
+        dict: {"sum_price_product": int, "total_products": int}
+
+    Исключения:
+        WebDriverException, TimeoutException: Ошибки загрузки страницы в Selenium.
+    """
+    logger.debug(f"Обрабатывается страница {page_num}")
+    return extract_page_stats(get_bs4_with_selenium(url, crawl_id), page_num)
+
+
+def parser_page(url: str, page_num: int, result_queue: Queue, policy: Optional[FetchPolicy] = None,
+                crawl_id: Optional[str] = None) -> None:
+    """
+    Парсит страницу по политике загрузки и добавляет результат в очередь.
+
+    Параметры:
+        url (str): URL страницы для загрузки и парсинга,
+        page_num(str): номер страницы который парсим (переменная для логов),
+        policy (FetchPolicy): политика повторов и ограничения параллельности,
+        crawl_id (str): идентификатор обхода для архива снимков.
+    Возвращает:
+        None. В очередь кладется {"ok": True, ...результат parse_page}
+        или {"ok": False, "page_num": page_num} если страницу загрузить не удалось.
+    """
+    policy = policy or FetchPolicy()
+    try:
+        res = policy.call(url, parse_page, url, page_num, crawl_id)
+    except Exception as e:
+        logger.error(f"Страница {page_num} не обработана: {str(e)}")
+        result_queue.put({"ok": False, "page_num": page_num})
+        return
+    result_queue.put({"ok": True, **res})  # Отправляем результат в очередь
+
+
+def extract_count_pages(soup) -> Optional[int]:
+    """
+    Определяет количество страниц с товарами по блоку пагинации загруженной страницы.
+
+    Исключения:
+        AttributeError: Блок пагинации не найден
+        ValueError, IndexError: Текст пагинации имеет неожиданный формат
+    """
+    # Получение строки с данными
+    logger.debug("Поиск элемента пагинации")
+    paginator_count = soup.find("div", class_="paginator__count").get_text(strip=True)
+
+    if not paginator_count:
+        logger.warning("Элемент пагинации не найден")
+        return None
+
+    # Обработка текста с количеством товаров
+    info_text = paginator_count.replace("Показано:", "").replace(" из", "").strip().split(" ")
+    logger.debug(f"Получен текст пагинации: {info_text}")
+
+    # Получение общего кол-ва товаров и кол-ва товаров на одной странице
+    total_products = int(info_text[1])
+    products_in_page = int(info_text[0][2:])
+
+    # Расчет количества страниц
+    count_pages = (total_products + products_in_page - 1) // products_in_page  # Округление вверх
+    logger.info(f"Успешно определено, что кол-во страниц с товарами = {count_pages}")
+    return count_pages
+
+
+def get_count_page(policy: Optional[FetchPolicy] = None, crawl_id: Optional[str] = None) -> Optional[int]:
     """
     Определяет общее количество страниц с товарами для заданной категории.
 
@@ -62,35 +150,16 @@ def get_count_page() -> Optional[int]:
         int: Количество страниц с товарами
         None: Если не удалось определить количество страниц
     """
-    url = "https://www.onlinetrade.ru/catalogue/smartfony-c13/?presets=0&preset_id=0&producer%5B0%5D=XIAOMI&price1=5990&price2=156999&diagonal1=6.36&diagonal2=6.88&volume_akumm1=4780&volume_akumm2=5500&advanced_search=1&rating_active=0&special_active=1&selling_active=1&producer_active=1&price_active=0&os_active=1&platform_active=1&volume_mem_active=1&ram_active=1&diagonal_active=1&display_razr_active=0&chastota_obnovleniya_active=1&fotokamera_osnovnaya_active=1&front_camera_active=1&processor_active=1&phones_type_active=1&slot_dlya_karti_pamyati_active=1&fbz_active=1&besprovod_zaryad_active=1&radio_active=1&nfc_active=1&5g_active=1&kov_sim_active=1&stepen_zashchiti_active=0&color_active=1&volume_akumm_active=1"
+    url = build_page_url()
     try:
         logger.debug("Получение данных с основной страницы")
-        soup = get_bs4_with_selenium(url)
+        soup = (policy or FetchPolicy()).call(url, get_bs4_with_selenium, url, crawl_id)
 
         if not soup:
             logger.error("Не удалось получить содержимое страницы")
             return None
 
-        # Получение строки с данными
-        logger.debug("Поиск элемента пагинации")
-        paginator_count = soup.find("div", class_="paginator__count").get_text(strip=True)
-
-        if not paginator_count:
-            logger.warning("Элемент пагинации не найден")
-            return None
-
-        # Обработка текста с количеством товаров
-        info_text = paginator_count.replace("Показано:", "").replace(" из", "").strip().split(" ")
-        logger.debug(f"Получен текст пагинации: {info_text}")
-
-        # Получение общего кол-ва товаров и кол-ва товаров на одной странице
-        total_products = int(info_text[1])
-        products_in_page = int(info_text[0][2:])
-
-        # Расчет количества страниц
-        count_pages = (total_products + products_in_page - 1) // products_in_page  # Округление вверх
-        logger.info(f"Успешно определено, что кол-во страниц с товарами = {count_pages}")
-        return count_pages
+        return extract_count_pages(soup)
 
     except AttributeError as exp:
         logger.error(f"Ошибка парсинга: {str(exp)}")
@@ -100,17 +169,23 @@ def get_count_page() -> Optional[int]:
         logger.error(f"Непредвиденная ошибка: {str(exp)}", exc_info=True)
 
 
-def parser_online_trade():
+def parser_online_trade(crawl_id: Optional[str] = None):
     """
     Парсинг сайта onlinetrade.ru для сбора статистики по смартфонам Xiaomi.
-    Возвращает словарь с общей суммой цен и количеством товаров.
+    Возвращает словарь с общей суммой цен и количеством товаров,
+    количеством успешно обработанных и неудачных страниц и идентификатором обхода,
+    под которым загруженные страницы сохранены в архив снимков.
     """
 
-    total = {"total_price": 0, "total_products": 0}
+    cleanup_snapshots()
+    crawl_id = crawl_id or new_crawl_id()
+    total = {"total_price": 0, "total_products": 0, "pages_ok": 0, "pages_failed": 0, "crawl_id": crawl_id}
     result_queue = Queue()  # Создаем очередь для результатов
+    # Общая политика: параллельность подстраивается под задержки и ошибки сайта
+    policy = FetchPolicy()
 
     # Количество страниц с товарами
-    pages_count = get_count_page()
+    pages_count = get_count_page(policy, crawl_id)
     if not pages_count:
         logger.error("Не удалось определить количество страниц.")
         return total  # Возвращаем пустой результат
@@ -120,24 +195,16 @@ def parser_online_trade():
 
     for page_num in range(pages_count):
         try:
-            url = (
-                f"https://www.onlinetrade.ru/catalogue/smartfony-c13/?presets=0&preset_id=0&"
-                f"producer%5B0%5D=XIAOMI&price1=5990&price2=156999&diagonal1=6.36&diagonal2=6.88&"
-                f"volume_akumm1=4780&volume_akumm2=5500&advanced_search=1&rating_active=0&"
-                f"special_active=1&selling_active=1&producer_active=1&price_active=0&os_active=1&"
-                f"platform_active=1&volume_mem_active=1&ram_active=1&diagonal_active=1&"
-                f"display_razr_active=0&chastota_obnovleniya_active=1&fotokamera_osnovnaya_active=1&"
-                f"front_camera_active=1&processor_active=1&phones_type_active=1&slot_dlya_karti_pamyati_active=1&"
-                f"fbz_active=1&besprovod_zaryad_active=1&radio_active=1&nfc_active=1&5g_active=1&"
-                f"kov_sim_active=1&stepen_zashchiti_active=0&color_active=1&volume_akumm_active=1&page={page_num}"
-            )
-
-            thread = Thread(target=parser_page, args=(url, page_num, result_queue))
+            url = build_page_url(page_num)
+
+            # Потоки ждут свободного слота в AIMD-лимитере политики
+            thread = Thread(target=parser_page, args=(url, page_num, result_queue, policy, crawl_id))
             threads.append(thread)
             thread.start()  # Запускаем поток
 
         except Exception as e:
             logger.error(f"Ошибка при создании потока для страницы {page_num}: {str(e)}")
+            total["pages_failed"] += 1
 
     # Ожидание завершения всех потоков
     for thread in threads:
@@ -146,8 +213,14 @@ def parser_online_trade():
     # Сбор результатов из очереди
     while not result_queue.empty():
         result = result_queue.get()
+        if not result["ok"]:
+            total["pages_failed"] += 1
+            continue
+        total["pages_ok"] += 1
         total["total_price"] += result["sum_price_product"]
         total["total_products"] += result["total_products"]
 
+    if total["pages_failed"]:
+        logger.warning(f"Данные неполные: не обработано страниц {total['pages_failed']} из {pages_count}")
     logger.info("Итоговые результаты: %s", total)
     return total
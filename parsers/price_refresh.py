@@ -0,0 +1,333 @@
+"""
+Пакетное обновление цен по xpath из загруженных таблиц.
+
+Строки группируются по URL: каждая страница скачивается один раз, после чего
+по ней вычисляются все xpath этой страницы. Выражения xpath компилируются один
+раз на все строки, а результаты записываются в БД пакетно.
+"""
+
+import ipaddress
+import logging
+import math
+import os
+import socket
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlparse
+
+import requests
+from lxml import etree, html
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from database.db_manager import Database
+from logs.logging_config import setup_logging
+from parsers.extract_number import clean_price_string
+from parsers.fetch_policy import FetchPolicy, NonRetryableError
+from parsers.selenium_object import get_realistic_user_agent
+from profiling.profiler import stage
+from snapshots.archive import KIND_PRICE_REFRESH, cleanup_snapshots, new_crawl_id, save_snapshot
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Верхняя граница потоков; фактическую параллельность ограничивает AIMD-лимитер политики
+MAX_WORKERS = 16
+REQUEST_TIMEOUT = (10, 30)
+MAX_REDIRECTS = 5
+# Максимальный размер страницы: ответ читается потоком и обрывается на этой границе
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", 10 * 1024 * 1024))
+
+_thread_local = threading.local()
+
+
+class UnsafeURLError(ValueError, NonRetryableError):
+    """URL ведет не на публичный http(s)-адрес."""
+
+
+class PageUnavailableError(NonRetryableError):
+    """Сайт ответил ошибкой 4xx (кроме 429): повтор запроса не поможет."""
+
+
+class PageTooLargeError(NonRetryableError):
+    """Страница больше MAX_PAGE_SIZE."""
+
+
+def _check_public_address(host: str, address: str) -> None:
+    if not ipaddress.ip_address(address.split("%", 1)[0]).is_global:
+        raise UnsafeURLError(f"Адрес {host} не публичный: {address}")
+
+
+class _PublicPeerMixin:
+    """
+    Проверяет адрес, к которому фактически установлено соединение, до отправки запроса.
+    Проверка в check_public_url не защищает от повторного разрешения имени
+    (DNS rebinding): requests определяет адрес хоста заново.
+    """
+
+    def _new_conn(self):
+        sock = super()._new_conn()
+        try:
+            _check_public_address(self.host, sock.getpeername()[0])
+        except UnsafeURLError:
+            sock.close()
+            raise
+        return sock
+
+
+class _PublicHTTPConnection(_PublicPeerMixin, HTTPConnection):
+    pass
+
+
+class _PublicHTTPSConnection(_PublicPeerMixin, HTTPSConnection):
+    pass
+
+
+class _PublicHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _PublicHTTPConnection
+
+
+class _PublicHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _PublicHTTPSConnection
+
+
+class PublicAddressAdapter(HTTPAdapter):
+    """Адаптер requests, соединяющийся только с публичными адресами."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _PublicHTTPConnectionPool,
+            "https": _PublicHTTPSConnectionPool,
+        }
+
+
+def _session() -> requests.Session:
+    """Сессия requests своя у каждого потока: соединения к домену переиспользуются."""
+    if not hasattr(_thread_local, "session"):
+        session = requests.Session()
+        session.headers["User-Agent"] = get_realistic_user_agent()
+        adapter = PublicAddressAdapter()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _thread_local.session = session
+    return _thread_local.session
+
+
+def check_public_url(url: str) -> None:
+    """
+    Проверяет, что URL из таблицы пользователя можно загрузить с машины бота:
+    схема http/https, и все адреса хоста публичные (не localhost, не частные сети,
+    не link-local с сервисами метаданных облака).
+
+    Raises:
+        UnsafeURLError: Если URL не проходит проверку
+    """
+    try:
+        parsed = urlparse(url)
+        port = parsed.port
+    except ValueError as e:
+        raise UnsafeURLError(f"Недопустимый URL: {url}") from e
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise UnsafeURLError(f"Недопустимый URL: {url}")
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(parsed.hostname, port)}
+    except (socket.gaierror, UnicodeError) as e:
+        raise UnsafeURLError(f"Не удалось определить адрес {parsed.hostname}: {str(e)}") from e
+    for address in addresses:
+        _check_public_address(parsed.hostname, address)
+
+
+def read_limited(response: requests.Response, limit: int = MAX_PAGE_SIZE) -> bytes:
+    """
+    Читает тело ответа потоком, не больше limit байт.
+
+    Raises:
+        PageTooLargeError: Если тело больше limit
+    """
+    content_length = response.headers.get("Content-Length", "")
+    if content_length.isdigit() and int(content_length) > limit:
+        raise PageTooLargeError(f"Страница {response.url} больше {limit} байт: {content_length}")
+    chunks = []
+    size = 0
+    for chunk in response.iter_content(chunk_size=64 * 1024):
+        size += len(chunk)
+        if size > limit:
+            raise PageTooLargeError(f"Страница {response.url} больше {limit} байт")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def fetch_html(url: str) -> bytes:
+    """
+    Скачивает страницу и возвращает ее содержимое (не больше MAX_PAGE_SIZE байт).
+    Перенаправления проверяются так же, как исходный URL, а адрес соединения
+    проверяется при подключении.
+    """
+    for _ in range(MAX_REDIRECTS + 1):
+        check_public_url(url)
+        with stage("http_fetch"):
+            with _session().get(url, allow_redirects=False, timeout=REQUEST_TIMEOUT, stream=True) as response:
+                if not response.is_redirect:
+                    if 400 <= response.status_code < 500 and response.status_code != 429:
+                        raise PageUnavailableError(f"HTTP {response.status_code} для {url}")
+                    response.raise_for_status()
+                    return read_limited(response)
+                location = response.headers["Location"]
+        url = urljoin(url, location)
+    raise requests.TooManyRedirects(f"Больше {MAX_REDIRECTS} перенаправлений")
+
+
+def compile_xpaths(expressions) -> Dict[str, Optional[etree.XPath]]:
+    """Компилирует уникальные выражения xpath; для некорректных выражений - None."""
+    compiled = {}
+    for expression in set(expressions):
+        try:
+            compiled[expression] = etree.XPath(expression)
+        except etree.XPathSyntaxError as e:
+            logger.warning(f"Некорректный xpath '{expression}': {str(e)}")
+            compiled[expression] = None
+    return compiled
+
+
+def evaluate_price(tree, xpath: Optional[etree.XPath]) -> Optional[int]:
+    """Вычисляет xpath на дереве страницы и извлекает из результата цену."""
+    if xpath is None:
+        return None
+    result = xpath(tree)
+    if isinstance(result, list):
+        if not result:
+            return None
+        result = result[0]
+    # boolean(...) - не цена; bool проверяется раньше числа, так как это подкласс int
+    if isinstance(result, bool):
+        return None
+    # number(...), sum(...) и т.п. возвращают float: '11990.0' нельзя чистить от нецифровых символов
+    if isinstance(result, (int, float)):
+        return round(result) if math.isfinite(result) and result >= 0 else None
+    text = result.text_content() if hasattr(result, "text_content") else str(result)
+    return clean_price_string(text)
+
+
+def interleave_by_domain(urls: List[str]) -> List[str]:
+    """Чередует URL разных доменов, чтобы один медленный домен не занимал все потоки."""
+    by_domain = defaultdict(deque)
+    for url in urls:
+        by_domain[urlparse(url).netloc].append(url)
+
+    ordered = []
+    queues = list(by_domain.values())
+    for queue in cycle(queues):
+        if len(ordered) == len(urls):
+            break
+        if queue:
+            ordered.append(queue.popleft())
+    return ordered
+
+
+def load_rows(first_item_id: Optional[int] = None, last_item_id: Optional[int] = None) -> List[Tuple]:
+    """Читает из БД строки (id, url, xpath); без диапазона - все сохраненные строки."""
+    query = "SELECT id, url, xpath FROM zyuzlik WHERE url IS NOT NULL AND xpath IS NOT NULL"
+    params = ()
+    if first_item_id is not None and last_item_id is not None:
+        query += " AND id BETWEEN ? AND ?"
+        params = (first_item_id, last_item_id)
+    with stage("sqlite"), Database() as db:
+        return [tuple(row) for row in db.connection.execute(query, params)]
+
+
+def save_prices(prices: List[Tuple[int, int]]) -> None:
+    """Пакетно записывает цены (item_id, price) в zyuzlik и в историю цен."""
+    if not prices:
+        return
+    with stage("sqlite"), Database() as db:
+        with db.connection:
+            db.connection.executemany(
+                "UPDATE zyuzlik SET price = ?, price_updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                [(price, item_id) for item_id, price in prices]
+            )
+            db.connection.executemany(
+                "INSERT INTO price_history (item_id, price) VALUES (?, ?)", prices
+            )
+    logger.info(f"Сохранено цен: {len(prices)}")
+
+
+def refresh_prices(first_item_id: Optional[int] = None, last_item_id: Optional[int] = None,
+                   policy: Optional[FetchPolicy] = None, crawl_id: Optional[str] = None) -> dict:
+    """
+    Обновляет цены строк из БД: каждый URL скачивается один раз.
+
+    Args:
+        first_item_id, last_item_id: Диапазон id строк (например, одной загрузки);
+            если не указан, обновляются все сохраненные строки
+        policy: Политика загрузки (повторы, circuit breaker, AIMD-лимит)
+        crawl_id: Идентификатор обхода в архиве снимков (по умолчанию - новый)
+
+    Returns:
+        dict: Статистика: pages_ok, pages_failed, rows_updated, rows_failed
+    """
+    stats = {"pages_ok": 0, "pages_failed": 0, "rows_updated": 0, "rows_failed": 0}
+    rows = load_rows(first_item_id, last_item_id)
+    if not rows:
+        logger.info("Нет строк для обновления цен")
+        return stats
+
+    rows_by_url = defaultdict(list)
+    for item_id, url, xpath in rows:
+        rows_by_url[str(url).strip()].append((item_id, str(xpath).strip()))
+    compiled = compile_xpaths(xpath for url_rows in rows_by_url.values() for _, xpath in url_rows)
+    logger.info(f"Обновление цен: строк {len(rows)}, уникальных страниц {len(rows_by_url)}")
+
+    policy = policy or FetchPolicy()
+    cleanup_snapshots()
+    crawl_id = crawl_id or new_crawl_id()
+
+    def process_url(url: str) -> Optional[List[Tuple[int, Optional[int]]]]:
+        try:
+            # Недопустимый URL не повторяем и не учитываем в circuit breaker
+            check_public_url(url)
+        except UnsafeURLError as e:
+            logger.warning(f"Страница пропущена: {str(e)}")
+            return None
+        try:
+            content = policy.call(url, fetch_html, url)
+            save_snapshot(url, content, crawl_id, KIND_PRICE_REFRESH)
+            with stage("lxml_parse"):
+                tree = html.fromstring(content)
+        except Exception as e:
+            logger.error(f"Страница {url} не загружена: {str(e)}")
+            return None
+        results = []
+        for item_id, xpath in rows_by_url[url]:
+            try:
+                with stage("xpath_eval"):
+                    price = evaluate_price(tree, compiled[xpath])
+                results.append((item_id, price))
+            except etree.XPathEvalError as e:
+                logger.warning(f"Ошибка вычисления xpath для строки {item_id}: {str(e)}")
+                results.append((item_id, None))
+        return results
+
+    prices = []
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        urls = interleave_by_domain(list(rows_by_url))
+        for url, results in zip(urls, executor.map(process_url, urls)):
+            if results is None:
+                stats["pages_failed"] += 1
+                stats["rows_failed"] += len(rows_by_url[url])
+                continue
+            stats["pages_ok"] += 1
+            for item_id, price in results:
+                if price is None:
+                    stats["rows_failed"] += 1
+                else:
+                    prices.append((item_id, price))
+
+    save_prices(prices)
+    stats["rows_updated"] = len(prices)
+    logger.info(f"Обновление цен завершено: {stats}")
+    return stats
@@ -10,8 +10,11 @@ from selenium.common.exceptions import WebDriverException, TimeoutException
 from bs4 import BeautifulSoup
 import random
 import time
+from typing import Optional
 
 from logs.logging_config import setup_logging
+from profiling.profiler import stage
+from snapshots.archive import save_snapshot
 
 setup_logging()
 logger = logging.getLogger(__name__)
@@ -77,13 +80,14 @@ def human_like_interaction(driver):
         logger.warning(f"Ошибка взаимодействия: {str(e)}")
 
 
-def get_bs4_with_selenium(url: str) -> BeautifulSoup:
+def get_bs4_with_selenium(url: str, crawl_id: Optional[str] = None) -> BeautifulSoup:
     """
     Загружает веб-страницу по указанному URL с помощью Selenium, ожидает исчезновения спиннера и загрузки основного контента,
     имитирует поведение пользователя (скроллинг), и возвращает объект BeautifulSoup для дальнейшего парсинга.
 
     Параметры:
        url (str): URL страницы для загрузки и парсинга.
+       crawl_id (str): Идентификатор обхода; если указан, страница сохраняется в архив снимков.
 
     Возвращает:
        BeautifulSoup: Объект BeautifulSoup, содержащий HTML-код загруженной страницы.
@@ -97,55 +101,70 @@ def get_bs4_with_selenium(url: str) -> BeautifulSoup:
     driver = None
     try:
         # 1. Инициализация драйвера с ручным управлением параметрами
-        chrome_options = configure_chrome_options()
-        chrome_options.add_argument("--disable-site-isolation-trials")  # Добавляем экспериментальный параметр
-        driver = webdriver.Chrome(options=chrome_options)
+        with stage("chrome_start"):
+            chrome_options = configure_chrome_options()
+            chrome_options.add_argument("--disable-site-isolation-trials")  # Добавляем экспериментальный параметр
+            driver = webdriver.Chrome(options=chrome_options)
 
-        # 2. Улучшенная маскировка WebDriver
-        driver.execute_cdp_cmd("Network.setUserAgentOverride", {
-            "userAgent": get_realistic_user_agent() + " " + str(random.randint(1000, 9999))
-        })
+            # 2. Улучшенная маскировка WebDriver
+            driver.execute_cdp_cmd("Network.setUserAgentOverride", {
+                "userAgent": get_realistic_user_agent() + " " + str(random.randint(1000, 9999))
+            })
 
         # 3. Загрузка страницы с обработкой таймаутов
         driver.set_page_load_timeout(45)
-        try:
-            driver.get(url)
-        except TimeoutException:
-            logger.warning("Частичная загрузка страницы - продолжаем обработку")
+        with stage("page_load"):
+            try:
+                driver.get(url)
+            except TimeoutException:
+                logger.warning("Частичная загрузка страницы - продолжаем обработку")
 
         # 4. Комбинированное ожидание спиннера
-        try:
-            WebDriverWait(driver, 30).until(
-                lambda d: not d.find_elements(By.CSS_SELECTOR, ".spinner, .load, [class*='loading'], [id*='loader']")
-            )
-            logger.info("Спиннер/лоадер успешно скрыт")
-        except TimeoutException:
-            logger.error("Спиннер не исчез в течение 30 секунд")
-            raise
+        with stage("spinner_wait"):
+            try:
+                WebDriverWait(driver, 30).until(
+                    lambda d: not d.find_elements(By.CSS_SELECTOR, ".spinner, .load, [class*='loading'], [id*='loader']")
+                )
+                logger.info("Спиннер/лоадер успешно скрыт")
+            except TimeoutException:
+                logger.error("Спиннер не исчез в течение 30 секунд")
+                raise
 
         # 5. Явная проверка загрузки контента
-        WebDriverWait(driver, 20).until(
-            EC.visibility_of_element_located((By.CSS_SELECTOR, ".indexGoods__item"))
-        )
+        with stage("content_wait"):
+            WebDriverWait(driver, 20).until(
+                EC.visibility_of_element_located((By.CSS_SELECTOR, ".indexGoods__item"))
+            )
         logger.info("Основной контент подтвержден")
 
         # 6. Оптимизированная имитация поведения
-        for _ in range(2):
-            driver.execute_script("window.scrollTo(0, document.body.scrollHeight*0.7)")
-            time.sleep(random.uniform(0.5, 1.2))
-            driver.execute_script("window.scrollTo(0, document.body.scrollHeight*0.3)")
-            time.sleep(random.uniform(0.3, 0.7))
+        with stage("scroll"):
+            for _ in range(2):
+                driver.execute_script("window.scrollTo(0, document.body.scrollHeight*0.7)")
+                time.sleep(random.uniform(0.5, 1.2))
+                driver.execute_script("window.scrollTo(0, document.body.scrollHeight*0.3)")
+                time.sleep(random.uniform(0.3, 0.7))
 
         # 7. Финальная проверка
-        if "container" not in driver.page_source:
+        with stage("page_source"):
+            page_source = driver.page_source
+        if "container" not in page_source:
             raise WebDriverException("Контейнер контента не обнаружен")
 
-        return BeautifulSoup(driver.page_source, 'lxml')
+        save_snapshot(url, page_source, crawl_id)
+        with stage("bs4_parse"):
+            return BeautifulSoup(page_source, 'lxml')
 
     except Exception as e:
-        driver.save_screenshot(f'error_{datetime.now().strftime("%H%M%S")}.png')
+        # Драйвер мог не запуститься - тогда снимать скриншот нечем
+        if driver:
+            try:
+                driver.save_screenshot(f'error_{datetime.now().strftime("%H%M%S")}.png')
+            except WebDriverException as screenshot_error:
+                logger.warning(f"Не удалось сохранить скриншот: {str(screenshot_error)}")
         logger.error(f"Критическая ошибка: {str(e)}")
         raise
     finally:
         if driver:
-            driver.quit()
+            with stage("chrome_quit"):
+                driver.quit()
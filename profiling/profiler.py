@@ -0,0 +1,222 @@
+"""
+Профилирование отдельных заданий по запросу: загрузки файла, обновления цен, обхода каталога.
+
+Профилирование включается переменной PROFILE_JOBS=1 или командой администратора
+/profile on. На время задания запускается сэмплирующий профилировщик: фоновый поток
+каждые PROFILE_INTERVAL секунд снимает стеки всех потоков процесса. Профиль сохраняется
+в формате folded stacks (flamegraph.pl, inferno, speedscope) в downloads/profiles/.
+
+Дополнительно для этапов, размеченных через stage() (запуск Chrome, ожидание спиннера,
+разбор HTML, extract_number, SQLite и т.д.), считаются число вызовов, время по часам
+и процессорное время потока. Сводка сохраняется рядом с профилем в JSON.
+Когда профилирование выключено, stage() сводится к проверке одной глобальной переменной.
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+from logs.logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
+setup_logging()
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(Path(__file__).parent.parent, 'downloads', 'profiles'))
+# Интервал сэмплирования стеков, секунды
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", 0.01))
+
+_enabled = os.getenv("PROFILE_JOBS", "0") == "1"
+# Задание, которое профилируется сейчас; одновременно профилируется только одно
+_active: Optional["JobProfile"] = None
+_active_lock = threading.Lock()
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def set_enabled(enabled: bool) -> None:
+    """Включает или выключает профилирование следующих заданий."""
+    global _enabled
+    _enabled = enabled
+    logger.info(f"Профилирование заданий {'включено' if enabled else 'выключено'}")
+
+
+def folded_stack(thread_name: str, frame) -> str:
+    """Стек потока в формате folded: 'поток;внешняя функция;...;текущая функция'."""
+    names = []
+    while frame is not None:
+        names.append(f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_qualname}")
+        frame = frame.f_back
+    names.append(thread_name)
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    """Периодически снимает стеки всех потоков процесса, кроме своего."""
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own_id:
+                    self.stacks[folded_stack(thread_names.get(thread_id, str(thread_id)), frame)] += 1
+            self.samples += 1
+
+
+@dataclass
+class StageStats:
+    calls: int = 0
+    wall: float = 0.0
+    cpu: float = 0.0
+
+
+class JobProfile:
+    """Профиль одного задания: сэмплы стеков и время этапов."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.job_id = f"{time.strftime('%Y%m%d_%H%M%S')}_{name}"
+        self.stages: Dict[str, StageStats] = defaultdict(StageStats)
+        self.sampler = StackSampler()
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.folded_path: Optional[str] = None
+        self.summary_path: Optional[str] = None
+        self._lock = threading.Lock()
+        self._started_wall = 0.0
+        self._started_cpu = 0.0
+
+    def add_stage(self, name: str, wall: float, cpu: float) -> None:
+        with self._lock:
+            stats = self.stages[name]
+            stats.calls += 1
+            stats.wall += wall
+            stats.cpu += cpu
+
+    def start(self) -> None:
+        self._started_wall, self._started_cpu = time.perf_counter(), time.process_time()
+        self.sampler.start()
+
+    def stop(self) -> None:
+        self.sampler.stop()
+        self.wall = time.perf_counter() - self._started_wall
+        self.cpu = time.process_time() - self._started_cpu
+
+    def save(self) -> None:
+        """Сохраняет профиль <job_id>.folded и сводку этапов <job_id>.json."""
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        self.folded_path = os.path.join(PROFILE_DIR, f"{self.job_id}.folded")
+        with open(self.folded_path, 'w', encoding='utf-8') as folded_file:
+            for stack, count in self.sampler.stacks.most_common():
+                folded_file.write(f"{stack} {count}\n")
+
+        self.summary_path = os.path.join(PROFILE_DIR, f"{self.job_id}.json")
+        summary = {
+            "job_id": self.job_id,
+            "wall": round(self.wall, 3),
+            "cpu": round(self.cpu, 3),
+            "samples": self.sampler.samples,
+            "interval": self.sampler.interval,
+            "stages": {name: asdict(stats) for name, stats in self.sorted_stages()},
+        }
+        with open(self.summary_path, 'w', encoding='utf-8') as summary_file:
+            json.dump(summary, summary_file, ensure_ascii=False, indent=2)
+        logger.info(f"Профиль задания {self.job_id} сохранен: {self.folded_path}")
+
+    def sorted_stages(self):
+        with self._lock:
+            return sorted(self.stages.items(), key=lambda item: item[1].wall, reverse=True)
+
+
+@contextmanager
+def profile_job(name: str) -> Iterator[Optional[JobProfile]]:
+    """
+    Профилирует задание, если профилирование включено.
+
+    Возвращает JobProfile (файлы профиля заполнены после выхода из блока) или None,
+    если профилирование выключено или уже идет профилирование другого задания.
+    Сэмплы и этапы собираются по всему процессу, поэтому в профиль попадает
+    и работа заданий, выполняющихся одновременно с профилируемым.
+    """
+    global _active
+    if not _enabled:
+        yield None
+        return
+
+    with _active_lock:
+        job = None
+        if _active is None:
+            job = _active = JobProfile(name)
+    if job is None:
+        logger.warning(f"Задание {name} не профилируется: уже идет профилирование другого задания")
+        yield None
+        return
+
+    job.start()
+    try:
+        yield job
+    finally:
+        job.stop()
+        with _active_lock:
+            _active = None
+        try:
+            job.save()
+        except OSError as e:
+            logger.error(f"Не удалось сохранить профиль {job.job_id}: {str(e)}")
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Учитывает время блока как этап name профилируемого задания.
+    Этапы не должны быть вложены друг в друга, иначе их время посчитается дважды.
+    """
+    job = _active
+    if job is None:
+        yield
+        return
+
+    wall_start, cpu_start = time.perf_counter(), time.thread_time()
+    try:
+        yield
+    finally:
+        job.add_stage(name, time.perf_counter() - wall_start, time.thread_time() - cpu_start)
+
+
+def format_profile_summary(job: JobProfile) -> str:
+    """Краткая сводка профиля для отправки в чат."""
+    lines = [f"Профиль {job.job_id}: {job.wall:.1f} с, CPU процесса {job.cpu:.1f} с, "
+             f"сэмплов {job.sampler.samples}"]
+    stages = job.sorted_stages()
+    if stages:
+        # Этапы выполняются в нескольких потоках, поэтому сумма может превышать время задания
+        lines.append("Этапы (сумма по потокам):")
+        lines += [f"{name}: {stats.calls} выз., {stats.wall:.2f} с, CPU {stats.cpu:.2f} с"
+                  for name, stats in stages]
+    if job.folded_path:
+        lines.append(f"Файлы: {job.folded_path}, {job.summary_path}")
+    return "\n".join(lines)
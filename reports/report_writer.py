@@ -0,0 +1,163 @@
+"""
+Формирование отчета по загруженным данным в XLSX или CSV.
+
+Строки передаются генераторами и записываются сразу в файл: XLSX пишется
+в режиме constant_memory библиотеки xlsxwriter, поэтому потребление памяти
+не зависит от количества строк в отчете.
+"""
+
+import csv
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Tuple
+
+import xlsxwriter
+
+from database.db_manager import Database
+from logs.logging_config import setup_logging
+from profiling.profiler import stage
+
+logger = logging.getLogger(__name__)
+setup_logging()
+
+REPORTS_DIR = os.path.join(Path(__file__).parent.parent, 'downloads', 'reports')
+
+ITEM_COLUMNS = ("№", "Название", "Ссылка", "Цена")
+HISTORY_COLUMNS = ("Название", "Ссылка", "Цена", "Дата")
+CRAWL_STATS_LABELS = {
+    "total_products": "Товаров найдено",
+    "total_price": "Сумма цен",
+    "pages_ok": "Страниц обработано",
+    "pages_failed": "Страниц с ошибками",
+}
+
+# Размер порции строк, читаемых из БД за один раз
+FETCH_SIZE = 1000
+
+
+def _iter_query(query: str, params: tuple) -> Iterator[Tuple]:
+    """Порциями по FETCH_SIZE читает результат запроса из БД."""
+    with Database() as db:
+        cursor = db.connection.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                yield tuple(row)
+
+
+def iter_item_rows(first_item_id: int, last_item_id: int) -> Iterator[Tuple]:
+    """
+    Построчно выдает товары загрузки из БД с ценой, полученной по xpath.
+    Если цену еще не удалось получить, ячейка цены остается пустой.
+    """
+    rows = _iter_query(
+        "SELECT id, title, url, price FROM zyuzlik WHERE id BETWEEN ? AND ? ORDER BY id",
+        (first_item_id, last_item_id)
+    )
+    for item_id, title, url, price in rows:
+        yield item_id - first_item_id + 1, str(title).strip(), str(url).strip(), price
+
+
+def iter_price_history(first_item_id: int, last_item_id: int) -> Iterator[Tuple]:
+    """Построчно выдает из БД историю цен товаров загрузки."""
+    return _iter_query('''
+        SELECT z.title, z.url, h.price, h.fetched_at
+        FROM price_history AS h
+        JOIN zyuzlik AS z ON z.id = h.item_id
+        WHERE h.item_id BETWEEN ? AND ?
+        ORDER BY h.item_id, h.fetched_at
+    ''', (first_item_id, last_item_id))
+
+
+def crawl_stats_rows(crawl_stats: dict) -> Iterator[Tuple]:
+    """Выдает строки листа со статистикой парсинга."""
+    for key, label in CRAWL_STATS_LABELS.items():
+        if key in crawl_stats:
+            yield label, crawl_stats[key]
+    if crawl_stats.get("total_products"):
+        yield "Средняя цена", round(crawl_stats["total_price"] / crawl_stats["total_products"], 2)
+
+
+def write_xlsx_report(file_path: str, items: Iterable[Tuple], crawl_stats: Optional[dict] = None,
+                      history: Iterable[Tuple] = ()) -> int:
+    """
+    Записывает отчет в XLSX: листы с товарами, статистикой парсинга и историей цен.
+
+    Returns:
+        int: Количество записанных строк товаров
+    """
+    # Ссылки и названия пишутся как текст: гиперссылки хранятся в памяти до close()
+    # и ограничены 65530 на лист, а строки с "=" не должны становиться формулами
+    workbook = xlsxwriter.Workbook(file_path, {
+        "constant_memory": True,
+        "strings_to_urls": False,
+        "strings_to_formulas": False,
+    })
+    try:
+        header = workbook.add_format({"bold": True})
+
+        # В режиме constant_memory каждый лист пишется целиком и строго по порядку строк
+        sheet = workbook.add_worksheet("Товары")
+        sheet.write_row(0, 0, ITEM_COLUMNS, header)
+        count = 0
+        for count, item in enumerate(items, start=1):
+            sheet.write_row(count, 0, item)
+
+        stats_sheet = workbook.add_worksheet("Статистика парсинга")
+        for row_num, stat in enumerate(crawl_stats_rows(crawl_stats or {})):
+            stats_sheet.write_row(row_num, 0, stat)
+
+        history_sheet = workbook.add_worksheet("История цен")
+        history_sheet.write_row(0, 0, HISTORY_COLUMNS, header)
+        for row_num, record in enumerate(history, start=1):
+            history_sheet.write_row(row_num, 0, record)
+    finally:
+        workbook.close()
+
+    logger.info(f"XLSX-отчет сохранен: {file_path}, строк: {count}")
+    return count
+
+
+def write_csv_report(file_path: str, items: Iterable[Tuple]) -> int:
+    """Записывает товары в CSV (UTF-8 с BOM, чтобы Excel корректно открыл кириллицу)."""
+    count = 0
+    with open(file_path, "w", newline="", encoding="utf-8-sig") as report_file:
+        writer = csv.writer(report_file, delimiter=";")
+        writer.writerow(ITEM_COLUMNS)
+        for count, item in enumerate(items, start=1):
+            writer.writerow(item)
+
+    logger.info(f"CSV-отчет сохранен: {file_path}, строк: {count}")
+    return count
+
+
+def build_report(upload: dict, crawl_stats: Optional[dict] = None, report_format: str = "xlsx") -> str:
+    """
+    Формирует отчет по загруженному файлу и возвращает путь к нему.
+
+    Args:
+        upload: Запись о загрузке (database.uploads) с диапазоном first_item_id..last_item_id
+        crawl_stats: Итоги парсинга (результат parser_online_trade)
+        report_format: "xlsx" или "csv"
+
+    Raises:
+        ValueError: Если формат отчета не поддерживается
+    """
+    if report_format not in ("xlsx", "csv"):
+        raise ValueError(f"Неподдерживаемый формат отчета: {report_format}")
+
+    os.makedirs(REPORTS_DIR, exist_ok=True)
+    file_path = os.path.join(REPORTS_DIR, f"report_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.{report_format}")
+
+    # Пустая загрузка: диапазон, не содержащий записей
+    item_range = (upload["first_item_id"] or 0, upload["last_item_id"] or -1)
+    with stage("report"):
+        if report_format == "csv":
+            write_csv_report(file_path, iter_item_rows(*item_range))
+        else:
+            write_xlsx_report(file_path, iter_item_rows(*item_range), crawl_stats, iter_price_history(*item_range))
+    return file_path
@@ -0,0 +1,229 @@
+"""
+Архив снимков загруженных страниц.
+
+Каждая загруженная страница сохраняется сжатой (zstd, если установлен пакет
+zstandard, иначе gzip) в downloads/snapshots/<crawl_id>/, а в таблице snapshots
+ведется индекс по URL, времени загрузки, идентификатору и типу обхода
+(каталог onlinetrade.ru или обновление цен по xpath).
+
+Воркеры очереди не пишут снимки в свою локальную БД: снимки собираются через
+collect_snapshots() и передаются с результатом задачи, а бот сохраняет их
+у себя через import_snapshot().
+
+Обходы старше SNAPSHOT_RETENTION_DAYS дней удаляет cleanup_snapshots()
+при запуске следующего обхода.
+"""
+
+import base64
+import gzip
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List, Optional, Union
+
+from database.db_manager import Database
+from logs.logging_config import setup_logging
+from profiling.profiler import stage
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+setup_logging()
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", os.path.join(Path(__file__).parent.parent, 'downloads', 'snapshots'))
+# Архивирование можно отключить: SNAPSHOTS_ENABLED=0
+SNAPSHOTS_ENABLED = os.getenv("SNAPSHOTS_ENABLED", "1") == "1"
+# Сколько дней хранить обходы; 0 - хранить без ограничения
+SNAPSHOT_RETENTION_DAYS = float(os.getenv("SNAPSHOT_RETENTION_DAYS", 30))
+
+CODEC_ZSTD = "zstd"
+CODEC_GZIP = "gzip"
+DEFAULT_CODEC = CODEC_ZSTD if zstandard else CODEC_GZIP
+EXTENSIONS = {CODEC_ZSTD: ".html.zst", CODEC_GZIP: ".html.gz"}
+
+# Типы обходов: страницы каталога onlinetrade.ru и страницы из таблиц пользователей
+KIND_CATALOG = "catalog"
+KIND_PRICE_REFRESH = "price_refresh"
+
+
+def new_crawl_id() -> str:
+    """Идентификатор обхода: время запуска и случайный суффикс."""
+    return f"{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+
+
+def compress(content: bytes, codec: str = DEFAULT_CODEC) -> bytes:
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=10).compress(content)
+    return gzip.compress(content, compresslevel=6)
+
+
+def decompress(content: bytes, codec: str) -> bytes:
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Для чтения снимков zstd установите пакет zstandard")
+        return zstandard.ZstdDecompressor().decompress(content)
+    return gzip.decompress(content)
+
+
+# Снимки, собираемые в текущем потоке вместо записи на диск (см. collect_snapshots)
+_collector = threading.local()
+
+
+@contextmanager
+def collect_snapshots() -> Iterator[List[dict]]:
+    """
+    Пока выполняется блок, save_snapshot в этом потоке не пишет снимки локально,
+    а добавляет их в возвращаемый список (сжатое содержимое в base64) для передачи
+    с результатом задачи воркера.
+    """
+    collected = []
+    _collector.snapshots = collected
+    try:
+        yield collected
+    finally:
+        _collector.snapshots = None
+
+
+def _write_snapshot(crawl_id: str, url: str, fetched_at: float, codec: str, compressed: bytes,
+                    size: int, kind: str) -> str:
+    """Записывает сжатый снимок в архив и добавляет его в индекс."""
+    url_hash = hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+    crawl_dir = os.path.join(SNAPSHOT_DIR, crawl_id)
+    os.makedirs(crawl_dir, exist_ok=True)
+    path = os.path.join(crawl_dir, f"{url_hash}_{int(fetched_at * 1000)}{EXTENSIONS[codec]}")
+    with open(path, 'wb') as snapshot_file:
+        snapshot_file.write(compressed)
+
+    with stage("sqlite"), Database() as db:
+        with db.connection:
+            db.connection.execute('''
+                INSERT INTO snapshots (crawl_id, url, fetched_at, path, codec, size, compressed_size, kind)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (crawl_id, url, fetched_at, path, codec, size, len(compressed), kind))
+    logger.debug(f"Снимок {url} сохранен: {path}")
+    return path
+
+
+def save_snapshot(url: str, content: Union[str, bytes], crawl_id: Optional[str],
+                  kind: str = KIND_CATALOG) -> Optional[str]:
+    """
+    Сохраняет снимок страницы и добавляет его в индекс.
+    Ошибки архивирования только логируются: они не должны прерывать обход.
+    kind - тип обхода (KIND_CATALOG или KIND_PRICE_REFRESH), по нему выбирается способ повторного разбора.
+
+    Returns:
+        str: Путь к файлу снимка или None, если снимок не сохранен (или собран collect_snapshots)
+    """
+    if not SNAPSHOTS_ENABLED or crawl_id is None:
+        return None
+    try:
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        fetched_at = time.time()
+        with stage("snapshot_compress"):
+            compressed = compress(content)
+
+        collected = getattr(_collector, "snapshots", None)
+        if collected is not None:
+            collected.append({
+                "crawl_id": crawl_id, "url": url, "fetched_at": fetched_at, "codec": DEFAULT_CODEC,
+                "size": len(content), "kind": kind, "data": base64.b64encode(compressed).decode("ascii"),
+            })
+            return None
+        return _write_snapshot(crawl_id, url, fetched_at, DEFAULT_CODEC, compressed, len(content), kind)
+
+    except Exception as e:
+        logger.error(f"Не удалось сохранить снимок {url}: {str(e)}", exc_info=True)
+        return None
+
+
+def import_snapshot(record: dict) -> Optional[str]:
+    """Сохраняет в архив снимок, собранный collect_snapshots (например, на другой машине)."""
+    try:
+        return _write_snapshot(record["crawl_id"], record["url"], record["fetched_at"], record["codec"],
+                               base64.b64decode(record["data"]), record["size"], record["kind"])
+    except Exception as e:
+        logger.error(f"Не удалось сохранить снимок {record.get('url')}: {str(e)}", exc_info=True)
+        return None
+
+
+def load_snapshot(path: str, codec: str) -> bytes:
+    """Читает и распаковывает снимок."""
+    with open(path, 'rb') as snapshot_file:
+        return decompress(snapshot_file.read(), codec)
+
+
+def list_snapshots(crawl_id: str) -> List[dict]:
+    """Возвращает записи индекса снимков обхода в порядке загрузки."""
+    with Database() as db:
+        rows = db.connection.execute(
+            "SELECT * FROM snapshots WHERE crawl_id = ? ORDER BY fetched_at", (crawl_id,)
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def list_crawls(limit: int = 20) -> List[dict]:
+    """Возвращает последние обходы с количеством снимков."""
+    with Database() as db:
+        rows = db.connection.execute('''
+            SELECT crawl_id, MIN(kind) AS kind, COUNT(*) AS pages, MIN(fetched_at) AS started_at,
+                   SUM(size) AS size, SUM(compressed_size) AS compressed_size
+            FROM snapshots
+            GROUP BY crawl_id
+            ORDER BY started_at DESC
+            LIMIT ?
+        ''', (limit,)).fetchall()
+    return [dict(row) for row in rows]
+
+def cleanup_snapshots(retention_days: float = SNAPSHOT_RETENTION_DAYS) -> int:
+    """
+    Удаляет файлы и записи индекса обходов, последний снимок которых старше
+    retention_days дней. Обход удаляется целиком, чтобы его нельзя было
+    пересчитать лишь частично. Ошибки только логируются.
+
+    Returns:
+        int: Количество удаленных снимков
+    """
+    if retention_days <= 0:
+        return 0
+    cutoff = time.time() - retention_days * 86400
+    try:
+        with stage("sqlite"), Database() as db:
+            rows = db.connection.execute('''
+                SELECT id, path FROM snapshots
+                WHERE crawl_id IN (
+                    SELECT crawl_id FROM snapshots GROUP BY crawl_id HAVING MAX(fetched_at) < ?
+                )
+            ''', (cutoff,)).fetchall()
+            if not rows:
+                return 0
+            with db.connection:
+                db.connection.executemany("DELETE FROM snapshots WHERE id = ?", [(row["id"],) for row in rows])
+
+        crawl_dirs = set()
+        for row in rows:
+            try:
+                os.remove(row["path"])
+            except FileNotFoundError:
+                pass
+            crawl_dirs.add(os.path.dirname(row["path"]))
+        for crawl_dir in crawl_dirs:
+            try:
+                os.rmdir(crawl_dir)
+            except OSError:
+                # В каталоге остались посторонние файлы
+                pass
+        logger.info(f"Удалено снимков старше {retention_days:g} дн.: {len(rows)}")
+        return len(rows)
+
+    except Exception as e:
+        logger.error(f"Не удалось удалить старые снимки: {str(e)}", exc_info=True)
+        return 0
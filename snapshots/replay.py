@@ -0,0 +1,176 @@
+"""
+Повторный разбор сохраненного обхода без браузера и сети.
+
+Снимки страниц обхода распаковываются и разбираются параллельно в нескольких
+процессах той же логикой, что и при обходе: для каталога onlinetrade.ru -
+extract_page_stats и extract_count_pages, для обновления цен - вычисление
+xpath строк, сохраненных в БД для URL снимка.
+
+Запуск:
+    python -m snapshots.replay --list
+    python -m snapshots.replay <crawl_id> [--workers N]
+"""
+
+import argparse
+import logging
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+from bs4 import BeautifulSoup
+from lxml import etree, html
+
+from logs.logging_config import setup_logging
+from parsers.parser_onlinetrade import build_page_url, extract_count_pages, extract_page_stats
+from parsers.price_refresh import compile_xpaths, evaluate_price, load_rows
+from snapshots.archive import KIND_CATALOG, KIND_PRICE_REFRESH, list_crawls, list_snapshots, load_snapshot
+
+logger = logging.getLogger(__name__)
+setup_logging()
+
+
+def page_num_from_url(url: str) -> Optional[int]:
+    """Номер страницы каталога из параметра page URL (None - первая страница без номера)."""
+    page = parse_qs(urlparse(url).query).get("page")
+    return int(page[0]) if page else None
+
+
+def replay_catalog_snapshot(record: dict) -> dict:
+    """Разбирает снимок страницы каталога. Выполняется в отдельном процессе."""
+    kind = "count" if record["url"] == build_page_url() else "page"
+    try:
+        soup = BeautifulSoup(load_snapshot(record["path"], record["codec"]), "lxml")
+        if kind == "count":
+            return {"ok": True, "kind": kind, "pages_count": extract_count_pages(soup)}
+        return {"ok": True, "kind": kind, **extract_page_stats(soup, page_num_from_url(record["url"]))}
+    except Exception as e:
+        logger.error(f"Ошибка разбора снимка {record['path']}: {str(e)}")
+        return {"ok": False, "kind": kind}
+
+
+def replay_price_snapshot(record: dict) -> dict:
+    """
+    Вычисляет по снимку xpath строк этого URL (record["rows"]: пары (item_id, xpath)).
+    Выполняется в отдельном процессе.
+    """
+    try:
+        tree = html.fromstring(load_snapshot(record["path"], record["codec"]))
+    except Exception as e:
+        logger.error(f"Ошибка разбора снимка {record['path']}: {str(e)}")
+        return {"ok": False, "rows": len(record["rows"])}
+
+    compiled = compile_xpaths(xpath for _, xpath in record["rows"])
+    prices = []
+    for item_id, xpath in record["rows"]:
+        try:
+            prices.append((item_id, evaluate_price(tree, compiled[xpath])))
+        except etree.XPathEvalError as e:
+            logger.warning(f"Ошибка вычисления xpath для строки {item_id}: {str(e)}")
+            prices.append((item_id, None))
+    return {"ok": True, "rows": len(record["rows"]), "prices": prices}
+
+
+def replay_catalog(crawl_id: str, records: list, workers: Optional[int]) -> dict:
+    """Итоги повторного разбора обхода каталога в формате parser_online_trade."""
+    total = {"total_price": 0, "total_products": 0, "pages_ok": 0, "pages_failed": 0,
+             "pages_expected": None, "crawl_id": crawl_id}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(replay_catalog_snapshot, records, chunksize=4))
+
+    for result in results:
+        if result["kind"] == "count":
+            total["pages_expected"] = result.get("pages_count")
+        elif not result["ok"]:
+            total["pages_failed"] += 1
+        else:
+            total["pages_ok"] += 1
+            total["total_price"] += result["sum_price_product"]
+            total["total_products"] += result["total_products"]
+
+    # Страницы, снимков которых нет в архиве, тоже считаются неудачными
+    if total["pages_expected"]:
+        total["pages_failed"] = max(total["pages_failed"], total["pages_expected"] - total["pages_ok"])
+    return total
+
+
+def replay_price_refresh(crawl_id: str, records: list, workers: Optional[int]) -> dict:
+    """
+    Итоги повторного разбора обновления цен в формате refresh_prices.
+    Цены не записываются в БД: rows_updated - строки, для которых цена найдена.
+    """
+    total = {"pages_ok": 0, "pages_failed": 0, "rows_updated": 0, "rows_failed": 0, "crawl_id": crawl_id}
+
+    # xpath берутся из текущих строк БД с тем же URL, что и при обновлении цен
+    rows_by_url = defaultdict(list)
+    for item_id, url, xpath in load_rows():
+        rows_by_url[str(url).strip()].append((item_id, str(xpath).strip()))
+    records = [{**record, "rows": rows_by_url.get(record["url"], [])} for record in records]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(replay_price_snapshot, records, chunksize=4))
+
+    for result in results:
+        if not result["ok"]:
+            total["pages_failed"] += 1
+            total["rows_failed"] += result["rows"]
+            continue
+        total["pages_ok"] += 1
+        for _, price in result["prices"]:
+            total["rows_updated" if price is not None else "rows_failed"] += 1
+    return total
+
+
+def replay_crawl(crawl_id: str, workers: Optional[int] = None) -> dict:
+    """
+    Повторно разбирает все снимки обхода способом, соответствующим типу обхода.
+
+    Returns:
+        dict: Итоги в формате parser_online_trade (с ожидаемым количеством страниц)
+            или refresh_prices, в зависимости от типа обхода; пустой dict, если снимков нет
+
+    Raises:
+        ValueError: Если тип обхода неизвестен
+    """
+    # При повторных загрузках одной страницы берем последний снимок
+    latest = {}
+    for record in list_snapshots(crawl_id):
+        latest[record["url"]] = record
+    if not latest:
+        logger.error(f"Снимки обхода {crawl_id} не найдены")
+        return {}
+
+    kinds = {record["kind"] for record in latest.values()}
+    if len(kinds) != 1 or not kinds & {KIND_CATALOG, KIND_PRICE_REFRESH}:
+        raise ValueError(f"Неизвестный тип обхода {crawl_id}: {', '.join(sorted(kinds))}")
+    kind = kinds.pop()
+
+    logger.info(f"Повторный разбор обхода {crawl_id} ({kind}): снимков {len(latest)}")
+    if kind == KIND_PRICE_REFRESH:
+        total = replay_price_refresh(crawl_id, list(latest.values()), workers)
+    else:
+        total = replay_catalog(crawl_id, list(latest.values()), workers)
+    logger.info(f"Итоги повторного разбора: {total}")
+    return total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Повторный разбор сохраненного обхода")
+    parser.add_argument("crawl_id", nargs="?", help="Идентификатор обхода")
+    parser.add_argument("--workers", type=int, default=None, help="Количество процессов")
+    parser.add_argument("--list", action="store_true", help="Показать последние обходы")
+    args = parser.parse_args()
+
+    if args.list or not args.crawl_id:
+        for crawl in list_crawls():
+            print(f"{crawl['crawl_id']} ({crawl['kind']}): страниц {crawl['pages']}, "
+                  f"{crawl['size']} -> {crawl['compressed_size']} байт")
+        return
+
+    total = replay_crawl(args.crawl_id, args.workers)
+    for key, value in total.items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
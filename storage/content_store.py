@@ -0,0 +1,111 @@
+"""
+Контентно-адресуемое хранилище загруженных файлов.
+
+Файл скачивается потоково, порциями, с вычислением SHA-256 на лету и сохраняется
+под именем своего хеша: одинаковые файлы хранятся один раз, а файлы с одинаковыми
+именами от разных пользователей не перезаписывают друг друга.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable
+
+import requests
+
+from logs.logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
+setup_logging()
+
+STORE_DIR = os.path.join(Path(__file__).parent.parent, 'downloads', 'store')
+# Bot API не отдает ботам файлы больше 20 МБ
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", 20 * 1024 * 1024))
+CHUNK_SIZE = 64 * 1024
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+
+
+class UploadTooLargeError(ValueError):
+    """Файл превышает допустимый размер."""
+
+
+class FileDownloadError(RuntimeError):
+    """Файл не удалось скачать. Текст ошибки не содержит URL с токеном бота."""
+
+
+@dataclass
+class StoredFile:
+    """Файл, сохраненный в хранилище."""
+    sha256: str
+    path: str
+    size: int
+
+
+def store_path(sha256: str, extension: str = ".xlsx") -> str:
+    """Путь к файлу в хранилище: подкаталог по первым двум символам хеша."""
+    return os.path.join(STORE_DIR, sha256[:2], f"{sha256}{extension}")
+
+
+def store_stream(chunks: Iterable[bytes], extension: str = ".xlsx",
+                 max_size: int = MAX_UPLOAD_SIZE) -> StoredFile:
+    """
+    Записывает поток байтов во временный файл, считая хеш, и переносит в хранилище.
+
+    Raises:
+        UploadTooLargeError: Если поток длиннее max_size байт
+    """
+    os.makedirs(STORE_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+
+    tmp_fd, tmp_path = tempfile.mkstemp(dir=STORE_DIR, suffix=".part")
+    try:
+        with os.fdopen(tmp_fd, 'wb') as tmp_file:
+            for chunk in chunks:
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLargeError(f"Файл больше {max_size // (1024 * 1024)} МБ")
+                digest.update(chunk)
+                tmp_file.write(chunk)
+
+        sha256 = digest.hexdigest()
+        path = store_path(sha256, extension)
+        if os.path.exists(path):
+            logger.info(f"Файл {sha256} уже есть в хранилище")
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Переименование атомарно: параллельная загрузка того же файла даст тот же результат
+            os.replace(tmp_path, path)
+            logger.info(f"Файл сохранен в хранилище: {path} ({size} байт)")
+        return StoredFile(sha256=sha256, path=path, size=size)
+
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def store_telegram_file(token: str, file_path: str, extension: str = ".xlsx",
+                        max_size: int = MAX_UPLOAD_SIZE) -> StoredFile:
+    """
+    Потоково скачивает файл с серверов Telegram в хранилище.
+
+    Raises:
+        FileDownloadError: Ошибка сети или HTTP. Исходная ошибка requests не сохраняется,
+            так как ее текст содержит URL с токеном бота
+        UploadTooLargeError: Если файл длиннее max_size байт
+    """
+    url = f"{TELEGRAM_API_URL.rstrip('/')}/file/bot{token}/{file_path}"
+    try:
+        with requests.get(url, stream=True, timeout=(10, 60)) as response:
+            response.raise_for_status()
+            return store_stream(response.iter_content(CHUNK_SIZE), extension, max_size)
+    except requests.HTTPError as e:
+        status = e.response.status_code if e.response is not None else "?"
+        raise FileDownloadError(f"Telegram вернул HTTP {status} при скачивании файла") from None
+    except requests.RequestException as e:
+        raise FileDownloadError(f"Ошибка сети при скачивании файла: {type(e).__name__}") from None
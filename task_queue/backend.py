@@ -0,0 +1,357 @@
+"""
+Хранилище очереди задач для распределенного парсинга.
+
+Задачи объединяются в задания (job): бот создает задание и кладет в очередь
+по задаче на страницу, воркеры забирают задачи под аренду (lease) с ограниченным
+сроком, продлевают ее heartbeat-ом и сохраняют результат. Просроченная аренда
+возвращает задачу в очередь, пока не исчерпан лимит попыток.
+
+SQLiteQueueBackend работает только на одной машине: WAL и блокировки SQLite
+ненадежны на сетевых файловых системах (NFS, SMB). Воркеры на других машинах
+подключаются через HTTP-сервис очереди (task_queue.server) и HTTPQueueBackend.
+"""
+
+import json
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator, List, Optional
+
+import requests
+
+from database.db_manager import Database
+from logs.logging_config import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Путь к файлу очереди на локальном диске (не сетевая папка)
+QUEUE_DB_PATH = os.getenv("QUEUE_DB_PATH", "queue.db")
+# Адрес и токен HTTP-сервиса очереди для QUEUE_BACKEND=http
+QUEUE_URL = os.getenv("QUEUE_URL", "http://127.0.0.1:8765")
+QUEUE_TOKEN = os.getenv("QUEUE_TOKEN")
+
+STATUS_PENDING = "pending"
+STATUS_LEASED = "leased"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+@dataclass
+class Task:
+    """Задача, выданная воркеру под аренду."""
+    id: int
+    job_id: int
+    kind: str
+    payload: dict
+    attempts: int
+    lease_until: float
+
+
+class QueueBackend(ABC):
+    """Интерфейс хранилища очереди. Реализации должны гарантировать атомарность claim."""
+
+    @abstractmethod
+    def create_job(self, kind: str, payloads: List[dict], max_attempts: int = 3) -> int:
+        """Создает задание и ставит в очередь по задаче на каждый payload."""
+
+    @abstractmethod
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[Task]:
+        """Выдает воркеру следующую свободную задачу или None."""
+
+    @abstractmethod
+    def heartbeat(self, task_id: int, worker_id: str, lease_seconds: float) -> bool:
+        """Продлевает аренду. False - аренда потеряна (задачу забрал другой воркер)."""
+
+    @abstractmethod
+    def complete(self, task_id: int, worker_id: str, result: dict,
+                 new_tasks: Optional[List[dict]] = None) -> bool:
+        """
+        Сохраняет результат задачи и в той же транзакции добавляет в ее задание
+        новые задачи (new_tasks - payload-ы с ключом kind). False - аренда потеряна.
+        """
+
+    @abstractmethod
+    def fail(self, task_id: int, worker_id: str, error: str, retry_delay: float = 0.0) -> None:
+        """
+        Фиксирует ошибку: задача вернется в очередь не раньше чем через retry_delay секунд
+        или будет помечена как failed.
+        """
+
+    @abstractmethod
+    def reap_expired(self) -> int:
+        """Помечает failed задачи с просроченной арендой и исчерпанными попытками."""
+
+    @abstractmethod
+    def job_status(self, job_id: int) -> dict:
+        """Возвращает количество задач задания по статусам."""
+
+    @abstractmethod
+    def job_results(self, job_id: int) -> List[dict]:
+        """Возвращает результаты успешно выполненных задач задания."""
+
+    @abstractmethod
+    def clear_snapshots(self, job_id: int) -> None:
+        """Удаляет снимки страниц (ключ snapshots) из результатов задач задания."""
+
+
+class SQLiteQueueBackend(QueueBackend):
+    """
+    Очередь задач в SQLite для процессов одной машины.
+    Каждая операция открывает короткое соединение.
+    """
+
+    def __init__(self, db_name: str = QUEUE_DB_PATH):
+        self.db_name = db_name
+        self.create_tables()
+
+    @contextmanager
+    def _connect(self) -> Iterator[Database]:
+        with Database(self.db_name) as db:
+            # Ожидаем снятия блокировки другим процессом вместо мгновенной ошибки
+            db.connection.execute("PRAGMA busy_timeout = 30000")
+            yield db
+
+    def create_tables(self) -> None:
+        """Создание таблиц очереди."""
+        with self._connect() as db:
+            with db.connection:
+                # WAL допустим только потому, что файл очереди лежит на локальном диске
+                db.connection.execute("PRAGMA journal_mode = WAL")
+                db.connection.execute('''
+                    CREATE TABLE IF NOT EXISTS queue_jobs (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        kind TEXT NOT NULL,
+                        total_tasks INTEGER NOT NULL,
+                        created_at REAL NOT NULL
+                    )''')
+                db.connection.execute('''
+                    CREATE TABLE IF NOT EXISTS queue_tasks (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        job_id INTEGER NOT NULL REFERENCES queue_jobs(id),
+                        payload TEXT NOT NULL,
+                        status TEXT NOT NULL,
+                        worker_id TEXT,
+                        lease_until REAL,
+                        attempts INTEGER NOT NULL DEFAULT 0,
+                        max_attempts INTEGER NOT NULL,
+                        result TEXT,
+                        error TEXT,
+                        updated_at REAL NOT NULL
+                    )''')
+                db.connection.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_queue_tasks_status ON queue_tasks (status, lease_until)"
+                )
+                db.connection.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_queue_tasks_job ON queue_tasks (job_id, status)"
+                )
+
+    def create_job(self, kind: str, payloads: List[dict], max_attempts: int = 3) -> int:
+        now = time.time()
+        with self._connect() as db:
+            with db.connection:
+                cursor = db.connection.execute(
+                    "INSERT INTO queue_jobs (kind, total_tasks, created_at) VALUES (?, ?, ?)",
+                    (kind, len(payloads), now)
+                )
+                job_id = cursor.lastrowid
+                db.connection.executemany('''
+                    INSERT INTO queue_tasks (job_id, payload, status, max_attempts, updated_at)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', [
+                    (job_id, json.dumps({"kind": kind, **payload}), STATUS_PENDING, max_attempts, now)
+                    for payload in payloads
+                ])
+        logger.info(f"Создано задание {job_id} ({kind}), задач: {len(payloads)}")
+        return job_id
+
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[Task]:
+        now = time.time()
+        with self._connect() as db:
+            with db.connection:
+                # Один UPDATE ... RETURNING атомарен, поэтому задачу не получат два воркера
+                row = db.connection.execute('''
+                    UPDATE queue_tasks
+                    SET status = ?, worker_id = ?, lease_until = ?,
+                        attempts = attempts + 1, updated_at = ?
+                    WHERE id = (
+                        SELECT id FROM queue_tasks
+                        WHERE ((status = ? AND (lease_until IS NULL OR lease_until <= ?))
+                               OR (status = ? AND lease_until < ?))
+                          AND attempts < max_attempts
+                        ORDER BY id
+                        LIMIT 1
+                    )
+                    RETURNING id, job_id, payload, attempts, lease_until
+                ''', (STATUS_LEASED, worker_id, now + lease_seconds, now,
+                      STATUS_PENDING, now, STATUS_LEASED, now)).fetchone()
+
+        if row is None:
+            return None
+
+        payload = json.loads(row["payload"])
+        logger.info(f"Воркер {worker_id} взял задачу {row['id']} (попытка {row['attempts']})")
+        return Task(
+            id=row["id"],
+            job_id=row["job_id"],
+            kind=payload.pop("kind"),
+            payload=payload,
+            attempts=row["attempts"],
+            lease_until=row["lease_until"],
+        )
+
+    def heartbeat(self, task_id: int, worker_id: str, lease_seconds: float) -> bool:
+        now = time.time()
+        with self._connect() as db:
+            with db.connection:
+                cursor = db.connection.execute('''
+                    UPDATE queue_tasks SET lease_until = ?, updated_at = ?
+                    WHERE id = ? AND worker_id = ? AND status = ?
+                ''', (now + lease_seconds, now, task_id, worker_id, STATUS_LEASED))
+        return cursor.rowcount == 1
+
+    def complete(self, task_id: int, worker_id: str, result: dict,
+                 new_tasks: Optional[List[dict]] = None) -> bool:
+        now = time.time()
+        with self._connect() as db:
+            with db.connection:
+                row = db.connection.execute('''
+                    UPDATE queue_tasks SET status = ?, result = ?, error = NULL, updated_at = ?
+                    WHERE id = ? AND worker_id = ? AND status = ?
+                    RETURNING job_id, max_attempts
+                ''', (STATUS_DONE, json.dumps(result), now, task_id, worker_id, STATUS_LEASED)).fetchone()
+                if row is not None and new_tasks:
+                    # Новые задачи появляются вместе с завершением задачи, поэтому
+                    # ожидающий задание не увидит его завершенным раньше времени
+                    db.connection.executemany('''
+                        INSERT INTO queue_tasks (job_id, payload, status, max_attempts, updated_at)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', [
+                        (row["job_id"], json.dumps(payload), STATUS_PENDING, row["max_attempts"], now)
+                        for payload in new_tasks
+                    ])
+                    db.connection.execute(
+                        "UPDATE queue_jobs SET total_tasks = total_tasks + ? WHERE id = ?",
+                        (len(new_tasks), row["job_id"])
+                    )
+        if row is None:
+            logger.warning(f"Результат задачи {task_id} отброшен: аренда воркера {worker_id} утеряна")
+            return False
+        if new_tasks:
+            logger.info(f"Задача {task_id} добавила в задание {row['job_id']} задач: {len(new_tasks)}")
+        return True
+
+    def fail(self, task_id: int, worker_id: str, error: str, retry_delay: float = 0.0) -> None:
+        now = time.time()
+        with self._connect() as db:
+            with db.connection:
+                # У задачи в статусе pending lease_until - время, раньше которого ее не выдают
+                db.connection.execute('''
+                    UPDATE queue_tasks
+                    SET status = CASE WHEN attempts < max_attempts THEN ? ELSE ? END,
+                        error = ?, worker_id = NULL, lease_until = ?, updated_at = ?
+                    WHERE id = ? AND worker_id = ? AND status = ?
+                ''', (STATUS_PENDING, STATUS_FAILED, error, now + retry_delay, now,
+                      task_id, worker_id, STATUS_LEASED))
+
+    def reap_expired(self) -> int:
+        now = time.time()
+        with self._connect() as db:
+            with db.connection:
+                cursor = db.connection.execute('''
+                    UPDATE queue_tasks
+                    SET status = ?, error = COALESCE(error, 'Истек срок аренды'), updated_at = ?
+                    WHERE status = ? AND lease_until < ? AND attempts >= max_attempts
+                ''', (STATUS_FAILED, now, STATUS_LEASED, now))
+        if cursor.rowcount:
+            logger.warning(f"Помечено как failed задач с истекшей арендой: {cursor.rowcount}")
+        return cursor.rowcount
+
+    def job_status(self, job_id: int) -> dict:
+        status = {STATUS_PENDING: 0, STATUS_LEASED: 0, STATUS_DONE: 0, STATUS_FAILED: 0}
+        with self._connect() as db:
+            rows = db.connection.execute(
+                "SELECT status, COUNT(*) AS cnt FROM queue_tasks WHERE job_id = ? GROUP BY status",
+                (job_id,)
+            ).fetchall()
+        for row in rows:
+            status[row["status"]] = row["cnt"]
+        return status
+
+    def job_results(self, job_id: int) -> List[dict]:
+        with self._connect() as db:
+            rows = db.connection.execute(
+                "SELECT result FROM queue_tasks WHERE job_id = ? AND status = ? ORDER BY id",
+                (job_id, STATUS_DONE)
+            ).fetchall()
+        return [json.loads(row["result"]) for row in rows]
+
+    def clear_snapshots(self, job_id: int) -> None:
+        with self._connect() as db:
+            with db.connection:
+                # Снимки уже сохранены в архив бота, в очереди они только занимают место
+                db.connection.execute('''
+                    UPDATE queue_tasks SET result = json_remove(result, '$.snapshots')
+                    WHERE job_id = ? AND status = ? AND result IS NOT NULL
+                ''', (job_id, STATUS_DONE))
+
+
+class HTTPQueueBackend(QueueBackend):
+    """Клиент HTTP-сервиса очереди (task_queue.server) для воркеров на других машинах."""
+
+    def __init__(self, base_url: str = QUEUE_URL, token: Optional[str] = QUEUE_TOKEN,
+                 timeout: float = 30):
+        if not token:
+            raise ValueError("Для QUEUE_BACKEND=http задайте QUEUE_TOKEN")
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self._session = requests.Session()
+        self._session.headers["Authorization"] = f"Bearer {token}"
+
+    def _call(self, method: str, **kwargs):
+        response = self._session.post(f"{self.base_url}/rpc/{method}", json=kwargs, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()["result"]
+
+    def create_job(self, kind: str, payloads: List[dict], max_attempts: int = 3) -> int:
+        return self._call("create_job", kind=kind, payloads=payloads, max_attempts=max_attempts)
+
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[Task]:
+        task = self._call("claim", worker_id=worker_id, lease_seconds=lease_seconds)
+        return Task(**task) if task is not None else None
+
+    def heartbeat(self, task_id: int, worker_id: str, lease_seconds: float) -> bool:
+        return self._call("heartbeat", task_id=task_id, worker_id=worker_id, lease_seconds=lease_seconds)
+
+    def complete(self, task_id: int, worker_id: str, result: dict,
+                 new_tasks: Optional[List[dict]] = None) -> bool:
+        return self._call("complete", task_id=task_id, worker_id=worker_id, result=result,
+                          new_tasks=new_tasks)
+
+    def fail(self, task_id: int, worker_id: str, error: str, retry_delay: float = 0.0) -> None:
+        self._call("fail", task_id=task_id, worker_id=worker_id, error=error, retry_delay=retry_delay)
+
+    def reap_expired(self) -> int:
+        return self._call("reap_expired")
+
+    def job_status(self, job_id: int) -> dict:
+        return self._call("job_status", job_id=job_id)
+
+    def job_results(self, job_id: int) -> List[dict]:
+        return self._call("job_results", job_id=job_id)
+
+    def clear_snapshots(self, job_id: int) -> None:
+        self._call("clear_snapshots", job_id=job_id)
+
+
+def get_backend() -> QueueBackend:
+    """Возвращает хранилище очереди, выбранное переменной окружения QUEUE_BACKEND."""
+    backend = os.getenv("QUEUE_BACKEND", "sqlite")
+    if backend == "sqlite":
+        return SQLiteQueueBackend()
+    if backend == "http":
+        return HTTPQueueBackend()
+    raise ValueError(f"Неизвестное хранилище очереди: {backend}")
@@ -0,0 +1,113 @@
+"""Постановка заданий парсинга в очередь и сбор их результатов."""
+
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from logs.logging_config import setup_logging
+from snapshots.archive import cleanup_snapshots, import_snapshot, new_crawl_id
+from task_queue.backend import (
+    STATUS_DONE,
+    STATUS_FAILED,
+    QueueBackend,
+    get_backend,
+)
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+
+def submit_online_trade_job(backend: QueueBackend, crawl_id: Optional[str] = None) -> int:
+    """
+    Ставит в очередь задание обхода каталога onlinetrade.ru. Количество страниц
+    определяет воркер (задача onlinetrade_count), он же добавляет в задание задачи
+    на каждую страницу, поэтому бот не запускает браузер.
+    """
+    return backend.create_job("onlinetrade_count", [{"crawl_id": crawl_id}])
+
+
+def wait_for_job(backend: QueueBackend, job_id: int, timeout: float = 1800,
+                 poll_interval: float = 2.0) -> dict:
+    """
+    Ожидает завершения всех задач задания.
+
+    Returns:
+        dict: Количество задач по статусам на момент завершения или таймаута
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        backend.reap_expired()
+        status = backend.job_status(job_id)
+        finished = status[STATUS_DONE] + status[STATUS_FAILED]
+        if finished == sum(status.values()):
+            return status
+        if time.monotonic() >= deadline:
+            logger.warning(f"Задание {job_id} не завершено за {timeout} сек: {status}")
+            return status
+        time.sleep(poll_interval)
+
+
+def aggregate_online_trade(backend: QueueBackend, job_id: int, crawl_id: Optional[str] = None) -> dict:
+    """
+    Суммирует результаты страниц задания в формате parser_online_trade
+    и сохраняет в локальный архив снимки страниц, полученные от воркеров;
+    после этого снимки удаляются из результатов задач в очереди.
+    """
+    total = {"total_price": 0, "total_products": 0, "pages_ok": 0, "pages_failed": 0, "crawl_id": crawl_id}
+    pages_count = None
+    for result in backend.job_results(job_id):
+        for snapshot in result.get("snapshots", ()):
+            import_snapshot(snapshot)
+        if "pages_count" in result:
+            pages_count = result["pages_count"]
+            continue
+        total["pages_ok"] += 1
+        total["total_price"] += result["sum_price_product"]
+        total["total_products"] += result["total_products"]
+    backend.clear_snapshots(job_id)
+
+    if pages_count is None:
+        logger.error(f"Задание {job_id}: не удалось определить количество страниц.")
+        return total
+    # Незавершенные к моменту сбора страницы тоже считаются неудачными
+    total["pages_failed"] = pages_count - total["pages_ok"]
+    return total
+
+
+def parser_online_trade_distributed(backend: Optional[QueueBackend] = None,
+                                    timeout: float = 1800) -> dict:
+    """
+    Распределенный вариант parser_online_trade: все страницы, включая страницу
+    с количеством страниц, обрабатывают воркеры (python -m task_queue.worker),
+    бот только ставит задание и собирает итог.
+    """
+    cleanup_snapshots()
+    crawl_id = new_crawl_id()
+    backend = backend or get_backend()
+
+    job_id = submit_online_trade_job(backend, crawl_id)
+    status = wait_for_job(backend, job_id, timeout=timeout)
+    total = aggregate_online_trade(backend, job_id, crawl_id)
+
+    logger.info(f"Итоговые результаты задания {job_id}: {total}, статусы задач: {status}")
+    return total
+
+
+async def parser_online_trade_distributed_async(backend: Optional[QueueBackend] = None,
+                                                timeout: float = 1800,
+                                                poll_interval: float = 2.0) -> dict:
+    """
+    Асинхронный вариант parser_online_trade_distributed для AsyncTeleBot:
+    ожидание задания не блокирует цикл событий, обращения к SQLite идут в потоках.
+    """
+    await asyncio.to_thread(cleanup_snapshots)
+    crawl_id = new_crawl_id()
+    backend = backend or await asyncio.to_thread(get_backend)
+
+    job_id = await asyncio.to_thread(submit_online_trade_job, backend, crawl_id)
+    # Ожидание то же, что и в синхронном варианте; поток пула занят только на время задания
+    status = await asyncio.to_thread(wait_for_job, backend, job_id, timeout, poll_interval)
+    total = await asyncio.to_thread(aggregate_online_trade, backend, job_id, crawl_id)
+    logger.info(f"Итоговые результаты задания {job_id}: {total}, статусы задач: {status}")
+    return total
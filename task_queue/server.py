@@ -0,0 +1,78 @@
+"""
+HTTP-сервис очереди задач для воркеров на других машинах.
+
+SQLite-очередь работает только на одной машине, поэтому сервис запускается рядом с
+файлом очереди и открывает методы QueueBackend по HTTP. Воркеры на других машинах
+подключаются к нему через HTTPQueueBackend (QUEUE_BACKEND=http).
+
+Запуск:
+    python -m task_queue.server --host 0.0.0.0 --port 8765
+"""
+
+import argparse
+import asyncio
+import hmac
+import logging
+import os
+from dataclasses import asdict
+
+from aiohttp import web
+
+from logs.logging_config import setup_logging
+from task_queue.backend import QueueBackend, SQLiteQueueBackend
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+QUEUE_TOKEN = os.getenv("QUEUE_TOKEN")
+
+# Методы QueueBackend, доступные по HTTP
+RPC_METHODS = {
+    "create_job", "claim", "heartbeat", "complete", "fail", "reap_expired", "job_status", "job_results",
+    "clear_snapshots",
+}
+
+
+def create_queue_app(backend: QueueBackend, token: str) -> web.Application:
+    """Создает приложение aiohttp: POST /rpc/<метод> с аргументами метода в JSON."""
+
+    async def handle_rpc(request: web.Request) -> web.Response:
+        if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+            logger.warning(f"Отклонен запрос к очереди без токена с {request.remote}")
+            return web.Response(status=401)
+
+        method = request.match_info["method"]
+        if method not in RPC_METHODS:
+            return web.Response(status=404)
+        try:
+            kwargs = await request.json()
+            # SQLite блокирует поток, поэтому вызовы идут вне цикла событий
+            result = await asyncio.to_thread(getattr(backend, method), **kwargs)
+        except TypeError as e:
+            return web.json_response({"error": f"Неверные аргументы: {str(e)}"}, status=400)
+        except Exception as e:
+            logger.error(f"Ошибка метода очереди {method}: {str(e)}", exc_info=True)
+            return web.json_response({"error": "Внутренняя ошибка очереди"}, status=500)
+
+        if method == "claim" and result is not None:
+            result = asdict(result)
+        return web.json_response({"result": result})
+
+    app = web.Application()
+    app.router.add_post("/rpc/{method}", handle_rpc)
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="HTTP-сервис очереди задач")
+    parser.add_argument("--host", default="127.0.0.1", help="Адрес для входящих подключений")
+    parser.add_argument("--port", type=int, default=8765, help="Порт")
+    args = parser.parse_args()
+
+    if not QUEUE_TOKEN:
+        raise ValueError("Задайте QUEUE_TOKEN: без него очередь была бы открыта всем")
+    web.run_app(create_queue_app(SQLiteQueueBackend(), QUEUE_TOKEN), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
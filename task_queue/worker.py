@@ -0,0 +1,212 @@
+"""
+Воркер распределенной очереди парсинга.
+
+Запуск на машине с файлом очереди или, с QUEUE_BACKEND=http, на любой машине
+с доступом к HTTP-сервису очереди (task_queue.server):
+    python -m task_queue.worker --lease 180
+"""
+
+import argparse
+import logging
+import os
+import socket
+import time
+import uuid
+from threading import Event, Thread
+from typing import Any, Callable, Dict, Optional
+
+from logs.logging_config import setup_logging
+from parsers.fetch_policy import FetchPolicy, backoff_delay
+from profiling.profiler import profile_job
+from snapshots.archive import collect_snapshots
+from task_queue.backend import QueueBackend, Task, get_backend
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+
+# Пауза перед повторной выдачей задачи после ошибки: экспонента с джиттером по номеру попытки
+RETRY_BASE_DELAY = 10.0
+RETRY_MAX_DELAY = 300.0
+
+# Повторы обращений к очереди (сбой HTTP, занятая SQLite): после них задача
+# вернется в очередь по истечении аренды
+QUEUE_CALL_ATTEMPTS = 5
+QUEUE_CALL_MAX_DELAY = 30.0
+
+# Политика загрузки общая для всех задач процесса воркера. Повторы выполняет очередь
+# (RETRY_*), поэтому политика делает одну попытку: иначе на страницу уходило бы
+# до max_attempts политики x max_attempts очереди запусков браузера
+_fetch_policy: Optional[FetchPolicy] = None
+
+
+def get_fetch_policy() -> FetchPolicy:
+    global _fetch_policy
+    if _fetch_policy is None:
+        _fetch_policy = FetchPolicy(max_attempts=1)
+    return _fetch_policy
+
+
+def _parse_onlinetrade_page(payload: dict) -> dict:
+    """Обработчик задачи: парсинг одной страницы каталога onlinetrade.ru."""
+    # Импорт внутри функции, чтобы воркер без Selenium мог обслуживать другие типы задач
+    from parsers.parser_onlinetrade import parse_page
+    url = payload["url"]
+    # Снимки страницы уходят боту вместе с результатом: воркер может работать на другой машине
+    with collect_snapshots() as snapshots:
+        result = get_fetch_policy().call(url, parse_page, url, payload["page_num"], payload.get("crawl_id"))
+    return {**result, "snapshots": snapshots}
+
+
+def _count_onlinetrade_pages(payload: dict) -> dict:
+    """
+    Обработчик задачи: определяет количество страниц каталога onlinetrade.ru
+    и ставит в то же задание задачи на каждую страницу (ключ new_tasks результата).
+    """
+    from parsers.parser_onlinetrade import build_page_url, get_count_page
+    crawl_id = payload.get("crawl_id")
+    with collect_snapshots() as snapshots:
+        pages_count = get_count_page(get_fetch_policy(), crawl_id)
+    if not pages_count:
+        raise RuntimeError("Не удалось определить количество страниц")
+    return {
+        "pages_count": pages_count,
+        "snapshots": snapshots,
+        "new_tasks": [
+            {"kind": "onlinetrade_page", "url": build_page_url(page_num), "page_num": page_num,
+             "crawl_id": crawl_id}
+            for page_num in range(pages_count)
+        ],
+    }
+
+
+# Обработчик возвращает результат задачи; задачи из его ключа new_tasks
+# добавляются в задание вместе с завершением задачи
+TASK_HANDLERS: Dict[str, Callable[[dict], dict]] = {
+    "onlinetrade_count": _count_onlinetrade_pages,
+    "onlinetrade_page": _parse_onlinetrade_page,
+}
+
+
+def _call_queue(description: str, method: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Вызывает метод очереди с повторами при ошибках.
+
+    Returns:
+        Результат метода или None, если все попытки неудачны
+    """
+    for attempt in range(1, QUEUE_CALL_ATTEMPTS + 1):
+        try:
+            return method(*args, **kwargs)
+        except Exception as e:
+            if attempt == QUEUE_CALL_ATTEMPTS:
+                logger.error(f"Не удалось {description} после {attempt} попыток: {str(e)}", exc_info=True)
+                return None
+            delay = backoff_delay(attempt, cap=QUEUE_CALL_MAX_DELAY)
+            logger.warning(f"Ошибка очереди ({description}), повтор через {delay:.1f} сек: {str(e)}")
+            time.sleep(delay)
+
+
+def _heartbeat_loop(backend: QueueBackend, task: Task, worker_id: str,
+                    lease_seconds: float, done: Event) -> None:
+    """Продлевает аренду задачи, пока обработчик не завершится."""
+    interval = lease_seconds / 3
+    wait = interval
+    while not done.wait(wait):
+        try:
+            alive = backend.heartbeat(task.id, worker_id, lease_seconds)
+        except Exception as e:
+            # Поток не завершается: до истечения аренды остается время на повторы
+            logger.warning(f"Ошибка продления аренды задачи {task.id}: {str(e)}")
+            wait = min(interval, QUEUE_CALL_MAX_DELAY)
+            continue
+        if not alive:
+            logger.warning(f"Аренда задачи {task.id} утеряна воркером {worker_id}")
+            return
+        wait = interval
+
+
+def process_task(backend: QueueBackend, task: Task, worker_id: str, lease_seconds: float) -> None:
+    """Выполняет задачу под heartbeat и сохраняет результат или ошибку."""
+    handler = TASK_HANDLERS.get(task.kind)
+    if handler is None:
+        _call_queue(f"сохранить ошибку задачи {task.id}", backend.fail,
+                    task.id, worker_id, f"Неизвестный тип задачи: {task.kind}")
+        return
+
+    done = Event()
+    heartbeat = Thread(
+        target=_heartbeat_loop,
+        args=(backend, task, worker_id, lease_seconds, done),
+        daemon=True,
+    )
+    heartbeat.start()
+    try:
+        # При PROFILE_JOBS=1 каждая задача воркера профилируется отдельно
+        with profile_job(f"task_{task.id}"):
+            result = handler(task.payload)
+    except Exception as e:
+        logger.error(f"Ошибка выполнения задачи {task.id}: {str(e)}", exc_info=True)
+        _call_queue(f"сохранить ошибку задачи {task.id}", backend.fail, task.id, worker_id, str(e),
+                    retry_delay=backoff_delay(task.attempts, RETRY_BASE_DELAY, RETRY_MAX_DELAY))
+    else:
+        new_tasks = result.pop("new_tasks", None)
+        if _call_queue(f"сохранить результат задачи {task.id}", backend.complete,
+                       task.id, worker_id, result, new_tasks):
+            logger.info(f"Задача {task.id} выполнена")
+    finally:
+        done.set()
+        heartbeat.join()
+
+
+def run_worker(backend: Optional[QueueBackend] = None, lease_seconds: float = 180,
+               poll_interval: float = 2.0, stop_event: Optional[Event] = None) -> None:
+    """
+    Основной цикл воркера: забирает задачи из очереди, пока не установлен stop_event.
+
+    Args:
+        backend: Хранилище очереди (по умолчанию - из переменных окружения)
+        lease_seconds: Срок аренды задачи; продлевается каждые lease_seconds / 3
+        poll_interval: Пауза между опросами пустой очереди
+        stop_event: Событие остановки воркера
+    """
+    backend = backend or get_backend()
+    stop_event = stop_event or Event()
+    worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    logger.info(f"Воркер {worker_id} запущен")
+
+    while not stop_event.is_set():
+        try:
+            backend.reap_expired()
+            task = backend.claim(worker_id, lease_seconds)
+        except Exception as e:
+            logger.error(f"Ошибка доступа к очереди: {str(e)}", exc_info=True)
+            task = None
+
+        if task is None:
+            stop_event.wait(poll_interval)
+            continue
+
+        try:
+            process_task(backend, task, worker_id, lease_seconds)
+        except Exception as e:
+            # Воркер продолжает работу; задача вернется в очередь по истечении аренды
+            logger.error(f"Ошибка обработки задачи {task.id}: {str(e)}", exc_info=True)
+
+    logger.info(f"Воркер {worker_id} остановлен")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Воркер распределенного парсинга")
+    parser.add_argument("--lease", type=float, default=180, help="Срок аренды задачи, сек")
+    parser.add_argument("--poll", type=float, default=2.0, help="Интервал опроса очереди, сек")
+    args = parser.parse_args()
+
+    try:
+        run_worker(lease_seconds=args.lease, poll_interval=args.poll)
+    except KeyboardInterrupt:
+        logger.info("Воркер остановлен пользователем")
+
+
+if __name__ == "__main__":
+    main()
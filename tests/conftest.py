@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Модули проекта импортируются от корня репозитория, как при запуске python -m ...
+sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -0,0 +1,160 @@
+"""Переходы состояний CircuitBreaker и AIMDLimiter, повторы FetchPolicy."""
+
+import pytest
+
+from parsers import fetch_policy as fetch_policy_module
+from parsers.fetch_policy import AIMDLimiter, CircuitBreaker, FetchPolicy, NonRetryableError
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(fetch_policy_module.time, "monotonic", fake)
+    return fake
+
+
+def open_breaker(clock) -> CircuitBreaker:
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    for _ in range(3):
+        breaker.record_failure()
+    return breaker
+
+
+def test_breaker_opens_after_threshold(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_breaker_success_resets_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+
+def test_breaker_half_open_allows_single_probe(clock):
+    breaker = open_breaker(clock)
+    clock.advance(59)
+    assert not breaker.allow()
+
+    clock.advance(1)
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    # Пока идет пробный запрос, остальные ждут его результата
+    assert not breaker.allow()
+
+
+def test_breaker_probe_success_closes(clock):
+    breaker = open_breaker(clock)
+    clock.advance(60)
+    assert breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow() and breaker.allow()
+
+
+def test_breaker_probe_failure_reopens(clock):
+    breaker = open_breaker(clock)
+    clock.advance(60)
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    clock.advance(60)
+    assert breaker.allow()
+
+
+def test_breaker_wait_times_out_while_open(clock):
+    breaker = open_breaker(clock)
+    assert not breaker.wait(0)
+
+
+def test_limiter_additive_increase_up_to_max(clock):
+    limiter = AIMDLimiter(initial=2, max_limit=3, target_latency=1)
+    limiter.acquire()
+    limiter.release(latency=0.1, ok=True)
+    assert limiter.limit == pytest.approx(2.5)
+
+    for _ in range(10):
+        limiter.acquire()
+        limiter.release(latency=0.1, ok=True)
+    assert limiter.limit == 3
+
+
+def test_limiter_decreases_once_per_interval(clock):
+    limiter = AIMDLimiter(initial=8, target_latency=1, decrease_interval=10)
+    for _ in range(3):
+        limiter.acquire()
+    for _ in range(3):
+        limiter.release(latency=0.1, ok=False)
+    assert limiter.limit == 4
+
+    clock.advance(10)
+    limiter.acquire()
+    # Медленный ответ тоже снижает лимит
+    limiter.release(latency=5, ok=True)
+    assert limiter.limit == 2
+
+
+def test_limiter_does_not_go_below_min(clock):
+    limiter = AIMDLimiter(initial=2, min_limit=1, decrease_interval=0)
+    for _ in range(3):
+        limiter.acquire()
+        limiter.release(latency=0.1, ok=False)
+    assert limiter.limit == 1
+
+
+def test_policy_retries_then_raises_last_error(clock):
+    policy = FetchPolicy(max_attempts=3, base_delay=0, limiter_factory=AIMDLimiter)
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        raise ConnectionError(f"attempt {len(calls)}")
+
+    with pytest.raises(ConnectionError, match="attempt 3"):
+        policy.call("https://example.com/page", fetch)
+    assert len(calls) == 3
+
+
+def test_policy_does_not_retry_non_retryable_error(clock):
+    policy = FetchPolicy(max_attempts=3, base_delay=0, limiter_factory=AIMDLimiter, failure_threshold=1)
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        raise NonRetryableError("404")
+
+    with pytest.raises(NonRetryableError):
+        policy.call("https://example.com/missing", fetch)
+    assert len(calls) == 1
+    assert policy.breaker_for("https://example.com/").state == "closed"
+
+
+def test_policy_keeps_domains_separate(clock):
+    policy = FetchPolicy(limiter_factory=AIMDLimiter)
+    assert policy.breaker_for("https://a.example/1") is policy.breaker_for("https://a.example/2")
+    assert policy.breaker_for("https://a.example/1") is not policy.breaker_for("https://b.example/1")
+    assert policy.limiter_for("https://a.example/1") is not policy.limiter_for("https://b.example/1")
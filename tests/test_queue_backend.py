@@ -0,0 +1,126 @@
+"""Аренда задач в SQLiteQueueBackend: выдача, истечение аренды, повторы и задержка повтора."""
+
+import pytest
+
+from task_queue import backend as backend_module
+from task_queue.backend import (
+    STATUS_DONE,
+    STATUS_FAILED,
+    STATUS_LEASED,
+    STATUS_PENDING,
+    SQLiteQueueBackend,
+)
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(backend_module.time, "time", fake)
+    return fake
+
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    return SQLiteQueueBackend(str(tmp_path / "queue.db"))
+
+
+def test_claim_returns_tasks_in_order_once(queue):
+    job_id = queue.create_job("page", [{"page_num": 0}, {"page_num": 1}])
+
+    first = queue.claim("w1", lease_seconds=60)
+    second = queue.claim("w2", lease_seconds=60)
+
+    assert (first.job_id, first.kind, first.payload, first.attempts) == (job_id, "page", {"page_num": 0}, 1)
+    assert second.payload == {"page_num": 1}
+    assert queue.claim("w3", lease_seconds=60) is None
+    assert queue.job_status(job_id)[STATUS_LEASED] == 2
+
+
+def test_expired_lease_is_claimed_again(queue, clock):
+    queue.create_job("page", [{}])
+    task = queue.claim("w1", lease_seconds=60)
+
+    clock.advance(59)
+    assert queue.claim("w2", lease_seconds=60) is None
+
+    clock.advance(2)
+    reclaimed = queue.claim("w2", lease_seconds=60)
+    assert reclaimed.id == task.id
+    assert reclaimed.attempts == 2
+
+
+def test_heartbeat_extends_lease_and_lost_lease_rejects_result(queue, clock):
+    job_id = queue.create_job("page", [{}])
+    task = queue.claim("w1", lease_seconds=60)
+
+    clock.advance(50)
+    assert queue.heartbeat(task.id, "w1", lease_seconds=60)
+    clock.advance(50)
+    assert queue.claim("w2", lease_seconds=60) is None
+
+    clock.advance(11)
+    assert queue.claim("w2", lease_seconds=60) is not None
+    assert not queue.heartbeat(task.id, "w1", lease_seconds=60)
+    assert not queue.complete(task.id, "w1", {"ok": True})
+    assert queue.complete(task.id, "w2", {"ok": True})
+    assert queue.job_results(job_id) == [{"ok": True}]
+
+
+def test_reap_expired_fails_task_after_last_attempt(queue, clock):
+    job_id = queue.create_job("page", [{}], max_attempts=2)
+    queue.claim("w1", lease_seconds=60)
+    clock.advance(61)
+    queue.claim("w2", lease_seconds=60)
+
+    # Аренда последней попытки еще действует
+    assert queue.reap_expired() == 0
+    clock.advance(61)
+    assert queue.reap_expired() == 1
+    assert queue.claim("w3", lease_seconds=60) is None
+    assert queue.job_status(job_id)[STATUS_FAILED] == 1
+
+
+def test_fail_with_retry_delay_postpones_next_claim(queue, clock):
+    job_id = queue.create_job("page", [{}])
+    task = queue.claim("w1", lease_seconds=60)
+
+    queue.fail(task.id, "w1", "timeout", retry_delay=30)
+    assert queue.job_status(job_id)[STATUS_PENDING] == 1
+    clock.advance(29)
+    assert queue.claim("w2", lease_seconds=60) is None
+
+    clock.advance(1)
+    assert queue.claim("w2", lease_seconds=60).attempts == 2
+
+
+def test_fail_on_last_attempt_marks_task_failed(queue):
+    job_id = queue.create_job("page", [{}], max_attempts=1)
+    task = queue.claim("w1", lease_seconds=60)
+
+    queue.fail(task.id, "w1", "timeout")
+
+    assert queue.job_status(job_id)[STATUS_FAILED] == 1
+    assert queue.claim("w2", lease_seconds=60) is None
+
+
+def test_complete_adds_new_tasks_to_job(queue):
+    job_id = queue.create_job("count", [{}])
+    task = queue.claim("w1", lease_seconds=60)
+
+    assert queue.complete(task.id, "w1", {"pages_count": 2},
+                          new_tasks=[{"kind": "page", "page_num": 0}, {"kind": "page", "page_num": 1}])
+
+    status = queue.job_status(job_id)
+    assert (status[STATUS_DONE], status[STATUS_PENDING]) == (1, 2)
+    assert queue.claim("w1", lease_seconds=60).kind == "page"
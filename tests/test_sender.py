@@ -0,0 +1,51 @@
+"""Границы деления и объединения сообщений в bot/sender.py."""
+
+from bot.sender import RECORD_SEPARATOR, pack_messages, split_message
+
+
+def test_split_keeps_text_at_limit():
+    text = "a" * 10
+    assert split_message(text, limit=10) == [text]
+
+
+def test_split_by_records():
+    records = ["a" * 4, "b" * 4, "c" * 4]
+    text = RECORD_SEPARATOR.join(records)
+
+    # Две записи с разделителем занимают ровно 10 символов
+    assert split_message(text, limit=10) == [f"{'a' * 4}{RECORD_SEPARATOR}{'b' * 4}", "c" * 4]
+    assert split_message(text, limit=9) == records
+
+
+def test_split_long_record_by_lines():
+    record = "\n".join(["x" * 4, "y" * 4, "z" * 4])
+    text = f"{record}{RECORD_SEPARATOR}{'w' * 4}"
+
+    assert split_message(text, limit=9) == [f"{'x' * 4}\n{'y' * 4}", "z" * 4, "w" * 4]
+
+
+def test_split_long_line_by_characters():
+    assert split_message("a" * 25, limit=10) == ["a" * 10, "a" * 10, "a" * 5]
+
+
+def test_split_chunks_never_exceed_limit():
+    text = RECORD_SEPARATOR.join(f"{num}. " + "слово " * num for num in range(60))
+    chunks = split_message(text, limit=100)
+
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    # Теряются только разделители, по которым прошло деление
+    assert "".join(chunks).replace("\n", "") == text.replace("\n", "")
+
+
+def test_pack_merges_up_to_limit():
+    # "aaaa\n\nbbbb" - 10 символов, третий текст уже не помещается
+    assert pack_messages(["aaaa", "bbbb", "cccc"], limit=10) == [f"aaaa{RECORD_SEPARATOR}bbbb", "cccc"]
+    assert pack_messages(["aaaa", "bbbb"], limit=9) == ["aaaa", "bbbb"]
+
+
+def test_pack_splits_long_text():
+    assert pack_messages(["a" * 12, "b"], limit=10) == ["a" * 10, f"aa{RECORD_SEPARATOR}b"]
+
+
+def test_pack_empty():
+    assert pack_messages([]) == []
@@ -1,7 +1,7 @@
 import pandas as pd
 import logging
+from typing import Iterable, Optional, Tuple
 from logs.logging_config import setup_logging
-from parsers.extract_number import extract_number
 
 logger = logging.getLogger(__name__)
 setup_logging()
@@ -15,7 +15,9 @@ def get_text(data: pd.DataFrame) -> str:
         data (pd.DataFrame): DataFrame с обязательными колонками:
             - title: Название товара
             - url: Ссылка на товар
-            - xpath: HTML-контент с ценой
+            - xpath: Путь к элементу с ценой на странице товара
+
+    Цена в список не входит: ее получают по xpath со страницы товара (get_prices_text).
 
     Returns:
         str: Отформатированная строка с данными или сообщение об отсутствии данных
@@ -44,10 +46,9 @@ def get_text(data: pd.DataFrame) -> str:
                 # Извлечение и проверка данных
                 title = str(row['title']).strip()
                 url = str(row['url']).strip()
-                price_content = extract_number(str(row['xpath']))
 
                 # Валидация полей
-                if not all([title, url, price_content]):
+                if not all([title, url]):
                     logger.warning(f"Пропуск строки {index + 1} - отсутствуют данные")
                     error_count += 1
                     continue
@@ -56,7 +57,6 @@ def get_text(data: pd.DataFrame) -> str:
                 text.append(
                     f"{index + 1}. {title}\n"
                     f"Ссылка: {url}\n"
-                    f"Цена: {price_content}\n"
                 )
                 processed_count += 1
 
@@ -75,3 +75,26 @@ def get_text(data: pd.DataFrame) -> str:
     except Exception as e:
         logger.critical(f"Критическая ошибка обработки данных: {str(e)}", exc_info=True)
         raise
+
+
+def get_prices_text(rows: Iterable[Tuple], max_length: Optional[int] = None) -> Optional[str]:
+    """
+    Форматирует цены, полученные по xpath со страниц товаров.
+
+    Args:
+        rows: Строки (номер, название, ссылка, цена); цена None - не найдена
+        max_length: Максимальная длина текста
+
+    Returns:
+        str: Отформатированный список или None, если он длиннее max_length
+    """
+    text = []
+    length = 0
+    for num, title, url, price in rows:
+        price_text = f"{price} ₽" if price is not None else "не найдена"
+        record = f"{num}. {title}\nЦена: {price_text}\n"
+        length += len(record) + 1
+        if max_length is not None and length > max_length:
+            return None
+        text.append(record)
+    return '\n'.join(text) if text else "Данные не найдены"